@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+Step 3: extract text from the downloaded Form 5500 PDFs.
+
+Runs a process pool over the filings in the outputs/ filing store (see
+filing_store.py; a plain directory of *.pdf works too, e.g. an older flat
+outputs/). Each distinct PDF is extracted once; each worker streams it page by
+page into a gzip text object (pages separated by form feeds), so a 300-page
+attachment never sits in memory at once. Objects are keyed by the PDF's
+SHA-256 in an ExtractionCache under text_store/, so re-runs only extract
+new or changed filings. A per-filing summary (plan name, plan key, year,
+sha256, pages, characters, status, error) is written to text_store/index.csv.
+
+A corrupt PDF only marks its own row as failed; a worker that dies outright
+is replaced and its files are retried once in a fresh pool.
+"""
+
+import argparse
+import gzip
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pandas as pd
+from pypdf import PdfReader
+
+from extraction_cache import DEFAULT_MAX_BYTES, ExtractionCache, object_path
+from filing_store import FilingStore, sha256_file
+
+PDF_DIR = Path("outputs")
+TEXT_STORE_DIR = Path("text_store")
+INDEX_CSV = "index.csv"
+PAGE_SEPARATOR = "\f"
+INDEX_COLUMNS = ["pdf", "plan_name", "plan_key", "year", "sha256", "text_path", "pages", "chars", "status", "error"]
+
+
+def list_sources(pdf_dir: Path) -> list[tuple[Path, str, int | None, str]]:
+    """(pdf, plan name, plan key, year) per filing: from the store's manifest, or every *.pdf of a flat directory."""
+    if FilingStore.exists(pdf_dir):
+        store = FilingStore(pdf_dir)
+        try:
+            return [(pdf, plan_name, plan_key, year) for plan_name, plan_key, year, pdf in store.entries()]
+        finally:
+            store.close()
+    return [(pdf, "", None, "") for pdf in sorted(pdf_dir.glob("*.pdf"))]
+
+
+def iter_page_text(pdf_path: Path):
+    # pypdf parses pages lazily, so only one page's content is held at a time
+    reader = PdfReader(str(pdf_path))
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def extract_pdf(pdf_path: Path, objects_dir: Path, label: str | None = None) -> dict:
+    summary = {"pdf": label or pdf_path.name, "sha256": "", "text_path": "", "pages": 0, "chars": 0,
+               "status": "ok", "error": ""}
+    tmp_path = None
+    try:
+        summary["sha256"] = sha256_file(pdf_path)
+        out_path = object_path(objects_dir, summary["sha256"])
+        summary["text_path"] = str(out_path)
+
+        if out_path.exists():
+            # same bytes as a filing extracted before (e.g. a byte-identical re-download)
+            for text in read_pages(out_path):
+                summary["pages"] += 1
+                summary["chars"] += len(text)
+            summary["status"] = "cached"
+            return summary
+
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for i, text in enumerate(iter_page_text(pdf_path)):
+                if i:
+                    f.write(PAGE_SEPARATOR)
+                f.write(text)
+                summary["pages"] += 1
+                summary["chars"] += len(text)
+        os.replace(tmp_path, out_path)
+    except Exception as e:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+        summary.update(status="error", text_path="", error=f"{e.__class__.__name__}: {e}"[:300])
+    return summary
+
+
+def _run_pool(pdfs: list[tuple[Path, str]], objects_dir: Path, workers: int) -> tuple[list[dict], list[tuple]]:
+    """pdfs are (path, label); returns (summaries, pdfs whose worker died)."""
+    summaries, lost = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(extract_pdf, pdf, objects_dir, label): (pdf, label) for pdf, label in pdfs}
+        for future in as_completed(futures):
+            try:
+                summaries.append(future.result())
+            except BrokenProcessPool:
+                lost.append(futures[future])
+    return summaries, lost
+
+
+def extract_all(pdf_dir: Path = PDF_DIR, store_dir: Path = TEXT_STORE_DIR, workers: int | None = None,
+                max_cache_bytes: int = DEFAULT_MAX_BYTES) -> pd.DataFrame:
+    run_start = time.time()
+    cache = ExtractionCache(store_dir, max_cache_bytes)
+    sources = list_sources(pdf_dir)
+    # filings that share a stored object are extracted once; labels are paths relative to pdf_dir
+    labels = [str(pdf.resolve().relative_to(pdf_dir.resolve())) for pdf, *_ in sources]
+    pdfs = {label: pdf for label, (pdf, *_) in zip(labels, sources)}
+
+    # unchanged files (same path, size and mtime) with a live cache entry are skipped outright
+    summaries, todo, stats = [], [], {}
+    for label, pdf in pdfs.items():
+        st = pdf.stat()
+        stats[label] = (str(pdf.resolve()), st.st_size, st.st_mtime_ns)
+        sha256 = cache.lookup_file(*stats[label])
+        entry = cache.get(sha256) if sha256 else None
+        if entry:
+            summaries.append({"pdf": label, "sha256": sha256, "text_path": str(cache.object_path(sha256)),
+                              "pages": entry["pages"], "chars": entry["chars"], "status": "cached", "error": ""})
+        else:
+            todo.append((pdf, label))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+    print(f"{len(pdfs) - len(todo)} PDFs unchanged; extracting text from {len(todo)} with {workers} workers ...")
+
+    extracted, lost = _run_pool(todo, cache.objects_dir, workers) if todo else ([], [])
+    if lost:
+        # one crashing file takes down every in-flight task; retry those one by one
+        print(f"A worker crashed; retrying {len(lost)} files in isolation.")
+        for pdf in lost:
+            retried, still_lost = _run_pool([pdf], cache.objects_dir, 1)
+            extracted.extend(retried)
+            extracted.extend({"pdf": label, "sha256": "", "text_path": "", "pages": 0, "chars": 0,
+                              "status": "error", "error": "worker crashed"} for _, label in still_lost)
+
+    for summary in extracted:
+        if summary["status"] != "error":
+            cache.put(summary["sha256"], summary["pages"], summary["chars"])
+            cache.remember_file(*stats[summary["pdf"]], summary["sha256"])
+    summaries.extend(extracted)
+
+    evicted = cache.evict(protect_since=run_start)
+    if evicted:
+        print(f"Evicted {evicted} least-recently-used cache entries.")
+    cache.close()
+
+    # one row per filing, so two plans sharing a PDF both keep their row
+    by_label = {summary["pdf"]: summary for summary in summaries}
+    rows = [{**by_label[label], "plan_name": plan_name, "plan_key": plan_key, "year": year}
+            for label, (_, plan_name, plan_key, year) in zip(labels, sources)]
+    index_df = pd.DataFrame(rows, columns=INDEX_COLUMNS).astype({"plan_key": "Int64"})
+    index_df = index_df.sort_values(["pdf", "plan_name", "plan_key"]).reset_index(drop=True)
+    index_df.to_csv(store_dir / INDEX_CSV, index=False)
+
+    counts = index_df["status"].value_counts()
+    print(f"Extraction completed! {counts.get('ok', 0)} extracted, {counts.get('cached', 0)} cached, "
+          f"{counts.get('error', 0)} failed.")
+    print(f"The index has been saved to: {store_dir / INDEX_CSV}")
+    return index_df
+
+
+def read_pages(text_path: Path):
+    """Yield the pages of one stored document."""
+    with gzip.open(text_path, "rt", encoding="utf-8") as f:
+        buf = ""
+        for block in iter(lambda: f.read(1 << 16), ""):
+            buf += block
+            *pages, buf = buf.split(PAGE_SEPARATOR)
+            yield from pages
+        yield buf
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract text from downloaded Form 5500 PDFs")
+    parser.add_argument("--pdf-dir", default=str(PDF_DIR))
+    parser.add_argument("--store-dir", default=str(TEXT_STORE_DIR))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--max-cache-gb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                        help="size budget of the text cache; least recently used entries are evicted")
+    args = parser.parse_args()
+
+    extract_all(Path(args.pdf_dir), Path(args.store_dir), args.workers, int(args.max_cache_gb * 1024 ** 3))
+
+
+if __name__ == "__main__":
+    main()
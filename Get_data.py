@@ -8,41 +8,360 @@ Original file is located at
 """
 
 import pandas as pd
+import codecs
+import hashlib
 import re
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def process_form5500(file_path):
+import numpy as np
+
+from plan_registry import NO_KEY, REGISTRY_COLUMNS, REGISTRY_DTYPES, plan_ids, to_registry, with_names
+
+PLAN_PATTERN = r'401\(k\)|403\(b\)'
+KEY_COLUMNS = ['ACK_ID', 'SPONS_DFE_EIN', 'SPONS_DFE_PN']
+# plan size, for prioritizing Step 2 (participants at the beginning of the year)
+SIZE_COLUMN = 'TOT_PARTCP_BOY_CNT'
+CHUNKSIZE = 200_000
+# a stream hands its first NAME_BATCH_ROWS new plans over at once, then batches of at least that many,
+# or whatever is ready after NAME_BATCH_SECONDS; each batch is normalized (plan_names.py) as one
+NAME_BATCH_ROWS = 5_000
+NAME_BATCH_SECONDS = 1.0
+CACHE_DIR = ".form5500_cache"
+
+# --- optional columnar cache (pyarrow) ---
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# only the columns Step 1 reads are cached; the numeric ones as float64, null where the text is not a number
+PLAN_COLUMNS = ['PLAN_NAME'] + KEY_COLUMNS + [SIZE_COLUMN]
+NUMERIC_COLUMNS = ['SPONS_DFE_EIN', 'SPONS_DFE_PN', SIZE_COLUMN]
+# bump when the cached columns, the plan filter or the registry columns change
+CACHE_VERSION = 2
+
+
+def detect_encoding(file_path, block_size=1 << 20):
+    # decode the raw bytes once, block by block, instead of re-parsing the CSV on failure
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return 'latin1'
+    return 'utf-8'
+
+
+def file_fingerprint(file_path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return f"{os.path.getsize(file_path)}-{h.hexdigest()[:32]}"
+
+
+def cache_path_for(file_path, cache_dir=CACHE_DIR, kind="columns", fingerprint=None):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    fingerprint = fingerprint or file_fingerprint(file_path)
+    return os.path.join(cache_dir, f"{stem}__{fingerprint}__{kind}_v{CACHE_VERSION}.arrow")
+
+
+def _numbers(column):
+    text = pc.utf8_trim_whitespace(column)
+    plain = pc.match_substring_regex(text, r'^\d+(\.\d*)?$')
+    return pc.cast(pc.if_else(plain, text, pa.scalar(None, pa.string())), pa.float64())
+
+
+def build_columnar_cache(file_path, usecols, encoding, cache_path):
+    """
+    Convert the usecols of a Form 5500 CSV into an Arrow IPC file (keyed by
+    the source's size and SHA-256 through cache_path), with the numeric
+    columns typed. The conversion streams block by block; reuses an existing
+    cache file when the source has not changed.
+    """
+    if os.path.exists(cache_path):
+        return cache_path
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    # read as text so later blocks never disagree with the inferred schema, then typed block by block
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(encoding=encoding),
+        convert_options=pa_csv.ConvertOptions(include_columns=usecols,
+                                              column_types={c: pa.string() for c in usecols}),
+    )
+    numeric = [reader.schema.get_field_index(c) for c in NUMERIC_COLUMNS if c in usecols]
+    schema = reader.schema
+    for i in numeric:
+        schema = schema.set(i, pa.field(schema.field(i).name, pa.float64()))
+
+    tmp_path = cache_path + ".tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in reader:
+                columns = [_numbers(col) if i in numeric else col for i, col in enumerate(batch.columns)]
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+    os.replace(tmp_path, cache_path)
+    print(f"Columnar cache written: {cache_path}")
+    return cache_path
+
+
+def _iter_csv_chunks(file_path, encoding, usecols, chunksize):
+    reader = pd.read_csv(file_path, encoding=encoding, usecols=usecols, dtype=str, chunksize=chunksize)
+    return reader if chunksize else [reader]
+
+
+def _iter_cached_chunks(cache_path, chunksize=None):
+    # memory-mapped; the writer's blocks are regrouped into chunks of chunksize rows (one chunk without it)
+    with pa.memory_map(cache_path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+        step = chunksize or max(table.num_rows, 1)
+        for start in range(0, table.num_rows, step):
+            yield table.slice(start, step).to_pandas()
+
+
+def _open_plan_chunks(file_path, chunksize=None, use_cache=False, fingerprint=None):
+    """Chunks of PLAN_NAME plus the key and size columns, or None if the file has no PLAN_NAME."""
     # 1. read file
     print(f"Reading: {file_path}")
-    try:
-        # try to read two code formats
-        df = pd.read_csv(file_path, encoding='utf-8', low_memory=False)
-    except:
-        df = pd.read_csv(file_path, encoding='latin1', low_memory=False)
+    encoding = detect_encoding(file_path)
+    header = pd.read_csv(file_path, encoding=encoding, nrows=0).columns.tolist()
 
     # 2. search column 'PLAN_NAME'
     col_name = 'PLAN_NAME'
 
-    if col_name not in df.columns:
+    if col_name not in header:
         print(f"Error: Could not find the column named '{col_name}'.")
-        print("Please check your CSV file. The current column names are：", df.columns.tolist())
-        return
+        print("Please check your CSV file. The current column names are：", header)
+        return None
+
+    usecols = [c for c in PLAN_COLUMNS if c in header]
+    if use_cache and not HAS_PYARROW:
+        print("pyarrow is not installed, reading the CSV directly.")
+    elif use_cache:
+        cache_path = build_columnar_cache(file_path, usecols, encoding,
+                                          cache_path_for(file_path, fingerprint=fingerprint))
+        print(f"The target column has been locked: {col_name} (cache: {cache_path})")
+        return _iter_cached_chunks(cache_path, chunksize)
+
+    print(f"The target column has been locked: {col_name} (encoding: {encoding})")
+    return _iter_csv_chunks(file_path, encoding, usecols, chunksize)
+
+
+def _new_plans(chunks):
+    # 3. matching for 401(k) and 403(b), 4. keep the first filing of every plan key, chunk by chunk
+    seen_keys, seen_names = set(), set()
+    for chunk in chunks:
+        chunk = chunk[chunk['PLAN_NAME'].str.contains(PLAN_PATTERN, case=False, na=False, regex=True)]
+        batch = to_registry(chunk['PLAN_NAME'], chunk.get('SPONS_DFE_EIN'), chunk.get('SPONS_DFE_PN'),
+                            chunk.get('ACK_ID'), chunk.get(SIZE_COLUMN), normalize=False)
+
+        # filings without a usable EIN / PN are deduplicated by name, as before
+        keyed = batch['Plan_Key'].to_numpy() != NO_KEY
+        first = np.where(keyed, ~batch.duplicated('Plan_Key'), ~batch.duplicated('Full_Plan_Name'))
+        batch = batch[first]
+        keyed = keyed[first]
+        new = np.fromiter(
+            ((k not in seen_keys) if has_key else (n not in seen_names)
+             for k, n, has_key in zip(batch['Plan_Key'].tolist(), batch['Full_Plan_Name'].tolist(), keyed)),
+            dtype=bool, count=len(batch),
+        )
+        batch = batch[new].reset_index(drop=True)
+        seen_keys.update(batch.loc[keyed[new], 'Plan_Key'].tolist())
+        seen_names.update(batch.loc[~keyed[new], 'Full_Plan_Name'].tolist())
+        if len(batch):
+            yield batch
+
 
-    print(f"The target column has been locked: {col_name}")
+def _named(batches, min_rows=None, max_wait=None):
+    # search query, file slug and sponsor key, computed once per plan for every later stage. Without
+    # min_rows, over all batches at once. With it (streaming), the first min_rows plans go out as
+    # soon as they are known, then batches coalesced to min_rows plans or max_wait seconds.
+    pending, size, last = [], 0, None
+    for batch in batches:
+        if min_rows and last is None and len(batch) > min_rows:
+            pending.append(batch.iloc[min_rows:])
+            size += len(batch) - min_rows
+            batch = batch.iloc[:min_rows]
+            last = time.monotonic()
+            yield with_names(batch.reset_index(drop=True))
+            continue
+        pending.append(batch)
+        size += len(batch)
+        if min_rows and (last is None or size >= min_rows or time.monotonic() - last >= (max_wait or 0)):
+            yield with_names(pd.concat(pending, ignore_index=True))
+            pending, size, last = [], 0, time.monotonic()
+    if pending:
+        yield with_names(pd.concat(pending, ignore_index=True))
 
-    # 3. matching for 401(k) and 403(b)
-    pattern = r'401\(k\)|403\(b\)'
-    filtered_df = df[df[col_name].str.contains(pattern, case=False, na=False, regex=True)]
 
-    # 4. Extract the duplicate-free list
-    unique_plans = filtered_df[col_name].unique()
-    result_df = pd.DataFrame(unique_plans, columns=['Full_Plan_Name'])
+def _iter_registry_cache(registry_path, chunksize=None):
+    for batch in _iter_cached_chunks(registry_path, chunksize):
+        yield batch.astype(REGISTRY_DTYPES)
+
+
+def _saving_registry(batches, registry_path):
+    # written alongside the batches and only put in place once all of them went through
+    tmp_path = registry_path + ".tmp"
+    schema = pa.Schema.from_pandas(to_registry(pd.Series([], dtype='string')), preserve_index=False)
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for batch in batches:
+                    writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+                    yield batch
+        os.replace(tmp_path, registry_path)
+        print(f"Registry cache written: {registry_path}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _plan_batches(file_path, chunksize=None, use_cache=False, name_batch_rows=None, name_batch_seconds=None):
+    """
+    New registry rows batch by batch (see _named for name_batch_rows), or
+    None if the file has no PLAN_NAME. With use_cache, the selected registry
+    is cached too (under the source's fingerprint), so an unchanged file is
+    neither parsed nor filtered again.
+    """
+    if not (use_cache and HAS_PYARROW):
+        chunks = _open_plan_chunks(file_path, chunksize, use_cache)
+        return _named(_new_plans(chunks), name_batch_rows, name_batch_seconds) if chunks is not None else None
+
+    fingerprint = file_fingerprint(file_path)
+    registry_path = cache_path_for(file_path, kind="registry", fingerprint=fingerprint)
+    if os.path.exists(registry_path):
+        print(f"Reading: {file_path} (registry cache: {registry_path})")
+        return _iter_registry_cache(registry_path, chunksize)
+    chunks = _open_plan_chunks(file_path, chunksize, use_cache, fingerprint)
+    if chunks is None:
+        return None
+    return _saving_registry(_named(_new_plans(chunks), name_batch_rows, name_batch_seconds), registry_path)
+
+
+def process_form5500(file_path, chunksize=None, output_file="filtered_401k_403b_plans.csv", use_cache=False):
+    """
+    Filter 401(k)/403(b) plans out of a Form 5500 dump.
+
+    With chunksize set, the file is streamed in chunks of that many rows and
+    only PLAN_NAME plus the key columns are parsed, so peak memory stays flat
+    no matter how large the input is. With use_cache, those columns are
+    converted once into a typed columnar cache, and the selected plans are
+    cached as well: a later run on the same file reads the registry back
+    instead of filtering again.
+
+    The result is a plan registry (see plan_registry.py): one row per sponsor
+    EIN + plan number, with the plan name and the ACK_ID of its first filing.
+    """
+    batches = _plan_batches(file_path, chunksize, use_cache)
+    if batches is None:
+        return
+
+    batches = list(batches)
+    result_df = pd.concat(batches, ignore_index=True) if batches else to_registry(pd.Series([], dtype='string'))
+    memory_mb = result_df.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"Processing completed! {len(result_df)} plans have been selected ({memory_mb:.1f} MB in memory).")
 
     # 5. Save the result
-    output_file = "filtered_401k_403b_plans.csv"
+    if output_file:
+        result_df.to_csv(output_file, index=False)
+        print(f"The result has been saved to: {output_file}")
+    return result_df
+
+
+def stream_form5500(file_path, chunksize=CHUNKSIZE, output_file="filtered_401k_403b_plans.csv", use_cache=False):
+    """
+    Same filter as process_form5500, but yields new registry rows as soon as
+    they are known: the first NAME_BATCH_ROWS at once, then in batches of at
+    least that many or every NAME_BATCH_SECONDS, so
+    a consumer (Step 2) can start before the whole file is read. The output CSV is written alongside and only
+    replaces the previous one once the stream is exhausted.
+    """
+    batches = _plan_batches(file_path, chunksize, use_cache, NAME_BATCH_ROWS, NAME_BATCH_SECONDS)
+    if batches is None:
+        return
+
+    tmp_path = f"{output_file}.tmp" if output_file else None
+    if tmp_path:
+        pd.DataFrame(columns=REGISTRY_COLUMNS).to_csv(tmp_path, index=False)
+    total = 0
+    for batch in batches:
+        if tmp_path:
+            batch.to_csv(tmp_path, mode='a', header=False, index=False)
+        total += len(batch)
+        yield batch
+
+    print(f"Processing completed! {total} plans have been selected.")
+    if tmp_path:
+        os.replace(tmp_path, output_file)
+        print(f"The result has been saved to: {output_file}")
+
+
+YEARLY_FILE_PATTERN = re.compile(r'f_5500_(\d{4})_all\.csv$', re.IGNORECASE)
+
+
+def find_yearly_files(folder="."):
+    files = {}
+    for name in sorted(os.listdir(folder)):
+        m = YEARLY_FILE_PATTERN.search(name)
+        if m:
+            files[m.group(1)] = os.path.join(folder, name)
+    return files
+
+
+def _process_year(args):
+    year, file_path, chunksize, use_cache = args
+    result_df = process_form5500(file_path, chunksize=chunksize, output_file=None, use_cache=use_cache)
+    return year, result_df
+
+
+def process_form5500_years(files_by_year, output_file="filtered_401k_403b_plans_by_year.csv",
+                           max_workers=None, chunksize=CHUNKSIZE, use_cache=False):
+    """
+    Run process_form5500 over several yearly dumps in a process pool and merge
+    them into one plan registry, deduplicated on the plan key (the name for
+    plans without one), with an In_<year> presence column per year.
+    """
+    jobs = [(year, path, chunksize, use_cache) for year, path in sorted(files_by_year.items())]
+    if not jobs:
+        print("No yearly Form 5500 files were given.")
+        return
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    print(f"Processing {len(jobs)} yearly files with {max_workers} workers ...")
+
+    frames = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for year, year_df in pool.map(_process_year, jobs):
+            if year_df is None:
+                print(f"Skipping {year}: no 'PLAN_NAME' column.")
+                continue
+            frames.append(year_df.assign(Year=year))
+
+    if not frames:
+        print("No plans were selected from any year.")
+        return
+
+    # one row per plan id (EIN-PN, or the name for plans without a key), with the registry
+    # columns of the latest year the plan was filed in
+    combined = pd.concat(frames, ignore_index=True)
+    combined['Plan_ID'] = plan_ids(combined)
+    presence = pd.crosstab(combined['Plan_ID'], combined['Year']).astype(bool)
+    presence.columns = [f"In_{year}" for year in presence.columns]
+    latest = combined.drop_duplicates('Plan_ID', keep='last').set_index('Plan_ID')[REGISTRY_COLUMNS]
+    result_df = latest.join(presence).reset_index(drop=True)
+
     result_df.to_csv(output_file, index=False)
-    print(f"Processing completed! {len(unique_plans)} plans have been selected.")
+    print(f"Multi-year processing completed! {len(result_df)} plans across {len(frames)} years.")
     print(f"The result has been saved to: {output_file}")
+    return result_df
 
 # --- colab other ---
 try:
@@ -57,11 +376,11 @@ if __name__ == "__main__":
         uploaded = files.upload()
         if uploaded:
             fname = list(uploaded.keys())[0]
-            process_form5500(fname)
+            process_form5500(fname, chunksize=CHUNKSIZE, use_cache=True)
             files.download("filtered_401k_403b_plans.csv")
     else:
         path = input("Please enter the path: ")
         if os.path.exists(path):
-            process_form5500(path)
+            process_form5500(path, chunksize=CHUNKSIZE, use_cache=True)
         else:
             print("The file path does not exist!")
\ No newline at end of file
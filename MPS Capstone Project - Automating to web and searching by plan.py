@@ -3,7 +3,6 @@
 
 import pandas as pd
 import time
-import re
 from pathlib import Path
 
 from selenium import webdriver
@@ -14,28 +13,10 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 from webdriver_manager.chrome import ChromeDriverManager
 
-
-# ---------- helpers ----------
-def sanitize_filename(name: str, max_len: int = 120) -> str:
-    name = re.sub(r"\s+", " ", str(name)).strip()
-    name = re.sub(r'[\\/*?:"<>|]', "_", name)
-    return name[:max_len]
-
-
-def build_search_query(plan_name: str, max_words: int = 8) -> str:
-    s = " ".join(str(plan_name).strip().replace("\xa0", " ").split())
-    s = s.replace("&", " ").replace("(", " ").replace(")", " ").replace(",", " ")
-    s = re.sub(r"\s+", " ", s).strip()
-
-    drop = {
-        "INC", "INC.", "LLC", "L.L.C.", "CO", "CO.", "CORP", "CORPORATION",
-        "LTD", "LIMITED", "TRUST", "PLAN", "PROFIT", "SHARING", "SAVINGS",
-        "RETIREMENT", "EMPLOYEE", "BENEFIT"
-    }
-    words = [w for w in s.split() if w.upper() not in drop]
-    return " ".join(words[:max_words]) if words else s
+from plan_names import filename_slug, search_query
 
 
+# ---------- helpers ----------
 def list_pdfs(folder: Path) -> set[str]:
     return {p.name for p in folder.glob("*.pdf")}
 
@@ -186,8 +167,8 @@ def main():
         apply_year_filter(driver, wait, TARGET_YEAR)
 
         for raw_plan in plan_names:
-            query = build_search_query(raw_plan)
-            plan_slug = sanitize_filename(raw_plan)
+            query = search_query(raw_plan)
+            plan_slug = filename_slug(raw_plan)
 
             print(f"\n🔍 Searching for: {query}")
 
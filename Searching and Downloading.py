@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import argparse
 import pandas as pd
 import time
-import re
+import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from selenium import webdriver
@@ -11,76 +14,52 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException
 
+from browser_sessions import BrowserSession, SessionPool, resolve_driver
+from efast_http import BASE_URL, PAGE_SIZE, EfastHttpClient, is_throttled
+from job_ledger import FAILED_STATUSES, JobLedger
+from phase_stats import PhaseStats
+from crawl_scheduler import CrawlBudget, CrawlScheduler
+from filing_store import FilingStore
+from plan_matching import assign_rows, group_by_query
+from plan_registry import NO_KEY, PlanRegistry, plan_id, read_registry
+from rate_control import RateController
+from telemetry import METRICS_FILE, TRACE_FILE, Metrics, Step2Telemetry, TraceLog
 
-def sanitize_filename(name: str, max_len: int = 120) -> str:
-    name = re.sub(r"\s+", " ", str(name)).strip()
-    name = re.sub(r'[\\/*?:"<>|]', "_", name)
-    return name[:max_len]
 
+BREADCRUMB_DELETE = "//button[contains(@class,'breadcrumb-delete-btn')]"
 
-def build_search_query(plan_name: str, max_words: int = 8) -> str:
-    s = " ".join(str(plan_name).strip().replace("\xa0", " ").split())
-    for ch in ["&", "(", ")", ","]:
-        s = s.replace(ch, " ")
-    s = re.sub(r"\s+", " ", s).strip()
 
-    drop_words = {
-        "INC", "INC.", "LLC", "L.L.C.", "CO", "CO.", "CORP", "CORPORATION",
-        "LTD", "LIMITED", "TRUST", "PLAN", "PROFIT", "SHARING", "SAVINGS",
-        "RETIREMENT", "EMPLOYEE", "BENEFIT"
-    }
-    words = [w for w in s.split() if w.upper() not in drop_words]
-    return " ".join(words[:max_words]) if words else s
-
-
-def list_pdfs(folder: Path) -> set[str]:
-    return {p.name for p in folder.glob("*.pdf")}
-
-
-def move_new_pdf(download_dir: Path, before: set[str], target_path: Path) -> bool:
-    for _ in range(80): 
-        if any(p.suffix == ".crdownload" for p in download_dir.glob("*.crdownload")):
-            time.sleep(0.5)
-            continue
-
-        after = list_pdfs(download_dir)
-        new_files = list(after - before)
-        if new_files:
-            new_pdf = download_dir / new_files[0]
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-
-            if target_path.exists():
-                target_path.unlink()
-
-            new_pdf.rename(target_path)
-            return True
-
-        time.sleep(0.5)
-
-    return False
-
-
-def clear_plan_name_only(driver, wait, retries: int = 3) -> bool:
+def clear_plan_name_only(driver, wait, retries: int = 3, position: int = 2) -> bool:
+    """Remove the search breadcrumb, the position-th one (after the plan year's, when filtered)."""
     for _ in range(retries):
         try:
             btn = wait.until(
-                EC.element_to_be_clickable((By.XPATH, "(//button[contains(@class,'breadcrumb-delete-btn')])[2]"))
+                EC.element_to_be_clickable((By.XPATH, f"({BREADCRUMB_DELETE})[{position}]"))
             )
+            before = len(driver.find_elements(By.XPATH, BREADCRUMB_DELETE))
             driver.execute_script("arguments[0].scrollIntoView(true);", btn)
             driver.execute_script("arguments[0].click();", btn)
+            # wait for the breadcrumb to actually go away instead of sleeping
+            try:
+                wait.until(lambda d: len(d.find_elements(By.XPATH, BREADCRUMB_DELETE)) < before)
+            except TimeoutException:
+                pass
             return True
         except TimeoutException:
-            time.sleep(0.4)
+            continue
     return False
 
 
+TRY_LATER_MODAL = "//span[contains(text(),'Please try back later')]"
+NEXT_PAGE = "//*[contains(@class,'usa-pagination__next-page')]"
+
+
 def close_try_later_modal(driver, timeout: int = 3) -> bool:
     try:
         WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.XPATH, "//span[contains(text(),'Please try back later')]"))
+            EC.presence_of_element_located((By.XPATH, TRY_LATER_MODAL))
         )
         close_btn = WebDriverWait(driver, timeout).until(
             EC.element_to_be_clickable((
@@ -108,38 +87,53 @@ def apply_year_filter(driver, wait, year: str):
     )).click()
 
 
-def has_year_row(driver, year: str) -> bool:
-    rows = driver.find_elements(By.CSS_SELECTOR, "table tbody tr")
-    for row in rows:
+NAME_COL = 1
+YEAR_COL = 2
+EIN_COL = 3
+PN_COL = 4
+
+
+def read_result_rows(driver) -> list[dict]:
+    """Parse every result row once into plain dicts (index, plan_name, plan_year, and ein / pn if shown)."""
+    rows = []
+    for i, row in enumerate(driver.find_elements(By.CSS_SELECTOR, "table tbody tr")):
         tds = row.find_elements(By.TAG_NAME, "td")
-        if len(tds) < 3:
+        if len(tds) <= YEAR_COL:
             continue
-        if year in tds[2].text.strip():
-            return True
-    return False
+        rows.append({"index": i, "plan_name": tds[NAME_COL].text.strip(), "plan_year": tds[YEAR_COL].text.strip()})
+        if len(tds) > PN_COL:
+            rows[-1].update(ein=tds[EIN_COL].text.strip(), pn=tds[PN_COL].text.strip())
+    return rows
 
 
-def click_download_for_year(driver, year: str) -> bool:
+def more_result_pages(driver, rows: list[dict]) -> bool:
+    """
+    Whether the results go on past the page read: a next-page control is
+    shown, or the page is full (the page takes PAGE_SIZE hits from the
+    same search service as efast_http).
+    """
+    return len(rows) >= PAGE_SIZE or any(e.is_displayed() for e in driver.find_elements(By.XPATH, NEXT_PAGE))
+
+
+def click_download_row(driver, index: int) -> bool:
     for _ in range(3):
         try:
             rows = driver.find_elements(By.CSS_SELECTOR, "table tbody tr")
-            for row in rows:
-                tds = row.find_elements(By.TAG_NAME, "td")
-                if len(tds) < 3:
-                    continue
-
-                if year in tds[2].text.strip():
-                    icon = tds[0].find_element(By.TAG_NAME, "svg")
-                    driver.execute_script("arguments[0].scrollIntoView();", icon)
-                    time.sleep(0.3)
-                    driver.execute_script(
-                        "arguments[0].dispatchEvent(new Event('click', {bubbles: true}));",
-                        icon
-                    )
-                    return True
-            return False
+            if index >= len(rows):
+                return False
+            icon = rows[index].find_elements(By.TAG_NAME, "td")[0].find_element(By.TAG_NAME, "svg")
+            driver.execute_script("arguments[0].scrollIntoView();", icon)
+            driver.execute_script(
+                "arguments[0].dispatchEvent(new Event('click', {bubbles: true}));",
+                icon
+            )
+            return True
         except StaleElementReferenceException:
-            time.sleep(0.8)
+            # the table is re-rendering; wait for rows to be back rather than a fixed pause
+            try:
+                WebDriverWait(driver, 2).until(lambda d: d.find_elements(By.CSS_SELECTOR, "table tbody tr"))
+            except TimeoutException:
+                pass
 
     return False
 
@@ -148,105 +142,632 @@ TARGET_URL = "https://www.efast.dol.gov/5500Search/"
 TARGET_YEAR = "2024"
 
 csv_file = "filtered_401k_403b_plans.csv"
+results_csv = "step2_results.csv"
+ledger_db = "step2_ledger.sqlite"
 
 TEMP_DOWNLOAD_DIR = Path("outputs_tmp_downloads").resolve()
 TEMP_DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 OUTPUT_DIR = Path("outputs").resolve()
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 LIMIT = 10
+MAX_WORKERS = 8
+SESSION_SPARES = 1
+RECYCLE_AFTER = 200  # plans per browser session before its page is reloaded
+RANK_WINDOW = 5_000  # query groups the scheduler ranks together, read ahead across streamed batches
+RESULT_COLUMNS = ["Full_Plan_Name", "Plan_Key", "Query", "Search", "Status", "Saved_Path", "Years"]
 
 
-def main():
-    df = pd.read_csv(csv_file)
-    if "Full_Plan_Name" not in df.columns:
-        raise ValueError(
-            f"Missing 'Full_Plan_Name' in {csv_file}. Columns: {df.columns.tolist()}"
-        )
+def parse_years(spec: str) -> list[str]:
+    """"2024", "2021,2023" or "2019-2024" -> sorted list of year strings."""
+    years = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        years.update(str(y) for y in range(int(first), int(last or first) + 1))
+    return sorted(years)
 
-    plan_names = df["Full_Plan_Name"].dropna().astype(str).tolist()[:LIMIT]
 
-    options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")
-    options.add_experimental_option("prefs", {"download.default_directory": str(TEMP_DOWNLOAD_DIR)})
+def year_filter(years: list[str]) -> str | None:
+    # one year is narrowed on the site; several are searched unfiltered and split up locally
+    return years[0] if len(years) == 1 else None
 
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
+
+def make_driver(download_dir: Path, headless: bool = False, driver_path: str | None = None):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    else:
+        options.add_argument("--start-maximized")
+    options.add_experimental_option("prefs", {"download.default_directory": str(download_dir)})
+
+    return webdriver.Chrome(
+        service=Service(driver_path or resolve_driver()),
         options=options
     )
-    wait = WebDriverWait(driver, 20)
 
-    try:
-        driver.get(TARGET_URL)
-        close_try_later_modal(driver)
-        apply_year_filter(driver, wait, TARGET_YEAR)
-
-        for raw_plan in plan_names:
-            query = build_search_query(raw_plan)
-            plan_slug = sanitize_filename(raw_plan)
-
-            print(f"\nSearching: {query}")
 
-            search_box = wait.until(EC.element_to_be_clickable((By.ID, "search-field")))
+def load_search_page(driver, wait, rate: RateController, year: str | None = TARGET_YEAR):
+    driver.get(TARGET_URL)
+    if close_try_later_modal(driver):
+        rate.signal("throttled")
+    if year:
+        apply_year_filter(driver, wait, year)
+
+
+def reset_search(session: BrowserSession, phases: PhaseStats, year: str | None = TARGET_YEAR):
+    clear_wait = WebDriverWait(session.driver, phases.timeout("breadcrumb_clear", 20))
+    with phases.time("breadcrumb_clear"):
+        # without a year filter the search breadcrumb is the only one
+        cleared = clear_plan_name_only(session.driver, clear_wait, position=2 if year else 1)
+    if not cleared:
+        # swapped for a warm session by run_session instead of reloading and re-filtering here
+        session.dirty = True
+
+
+def is_ein_query(query: str) -> bool:
+    return len(query) == 9 and query.isdigit()
+
+
+def new_result(plan: str, query: str, status: str = "not_found", registry: PlanRegistry | None = None) -> dict:
+    """
+    plan is a plan id; the result carries the plan's name and key (NO_KEY
+    without one), which search answered it ("key" for a sponsor EIN, "name"
+    otherwise), and its Sponsor_Key for the ledger and scheduler (not a
+    RESULT_COLUMNS column).
+    """
+    registry = registry or PlanRegistry()
+    plan_key = registry.plan_key(plan)
+    return {"Full_Plan_Name": registry.name(plan), "Plan_Key": NO_KEY if plan_key is None else plan_key,
+            "Query": query, "Search": "key" if is_ein_query(query) else "name", "Status": status,
+            "Saved_Path": "", "Years": "", "Sponsor_Key": registry.sponsor_key(plan)}
+
+
+def with_name_fallback(search, query: str, plans: list[str], registry: PlanRegistry) -> list[dict]:
+    """
+    search(query, plans) -> results, in plans order. Plans a sponsor EIN
+    search did not find are searched again by name, since not_found is final
+    in the ledger; their results then carry the name query.
+    """
+    results = search(query, plans)
+    missing = [plan for plan, result in zip(plans, results) if result["Status"] == "not_found"]
+    if not is_ein_query(query) or not missing:
+        return results
+    retried = {}
+    for name_query, group in group_by_query(missing, registry.search_query):
+        retried.update(zip(group, search(name_query, group)))
+    return [retried.get(plan, result) for plan, result in zip(plans, results)]
+
+
+def add_year(result: dict, year: str, status: str, path: Path | None = None):
+    """
+    Fold one year's outcome into the plan's result. The plan is found once
+    any year is stored (Saved_Path is the latest one), but a failed year
+    wins so the ledger retries the plan; stored years are skipped then.
+    """
+    if status == "found":
+        stored = sorted({*filter(None, result["Years"].split(";")), year})
+        result["Years"] = ";".join(stored)
+        if year == stored[-1]:
+            result["Saved_Path"] = str(path)
+        if result["Status"] not in FAILED_STATUSES:
+            result["Status"] = "found"
+    elif status in FAILED_STATUSES:
+        result["Status"] = status
+
+
+def process_group(session: BrowserSession, query: str, plans: list[str], phases: PhaseStats,
+                  rate: RateController, store: FilingStore, tag: str = "", registry: PlanRegistry | None = None,
+                  years: list[str] = (TARGET_YEAR,)) -> list[dict]:
+    """
+    Run one search for every plan sharing this query, parse the result rows
+    once and download the matching row of each year for each plan (by EIN +
+    PN when the plan has a key in registry, by name otherwise) into the
+    filing store. plans are plan ids (plan_registry.plan_id).
+    """
+    driver, watcher = session.driver, session.watcher
+    registry = registry or PlanRegistry()
+    results = {plan: new_result(plan, query, registry=registry) for plan in plans}
+
+    print(f"\n{tag}Searching: {query} ({len(plans)} plan{'s' if len(plans) > 1 else ''})")
+
+    with rate.slot((TimeoutException,)) as slot:
+        submit_wait = WebDriverWait(driver, phases.timeout("search_submit", 20))
+        with phases.time("search_submit", (TimeoutException,)):
+            search_box = submit_wait.until(EC.element_to_be_clickable((By.ID, "search-field")))
             search_box.clear()
             search_box.send_keys(query)
             driver.execute_script(
                 "arguments[0].dispatchEvent(new Event('input', { bubbles: true }));",
                 search_box
             )
-            time.sleep(0.4)
+            submit_wait.until(lambda d: search_box.get_attribute("value") == query)
 
             try:
-                go_btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[.//span[text()='Go!']]")))
+                go_btn = submit_wait.until(EC.element_to_be_clickable((By.XPATH, "//button[.//span[text()='Go!']]")))
                 driver.execute_script("arguments[0].click();", go_btn)
             except TimeoutException:
                 pass
 
-            try:
-                WebDriverWait(driver, 10).until(
+        try:
+            with phases.time("results_render", (TimeoutException,)):
+                WebDriverWait(driver, phases.timeout("results_render", 10)).until(
                     lambda d: len(d.find_elements(By.CSS_SELECTOR, "table tbody tr")) > 0
                 )
-            except TimeoutException:
-                print("Not found")
-                if not clear_plan_name_only(driver, wait):
-                    driver.refresh()
-                    close_try_later_modal(driver)
-                    apply_year_filter(driver, wait, TARGET_YEAR)
-                continue
-
-            if not has_year_row(driver, TARGET_YEAR):
-                print("Not found")
-                if not clear_plan_name_only(driver, wait):
-                    driver.refresh()
-                    close_try_later_modal(driver)
-                    apply_year_filter(driver, wait, TARGET_YEAR)
-                continue
-
-            before = list_pdfs(TEMP_DOWNLOAD_DIR)
-            clicked = click_download_for_year(driver, TARGET_YEAR)
-
-            target_pdf = OUTPUT_DIR / f"{plan_slug}__{TARGET_YEAR}.pdf"
-            moved = False
-
-            if clicked:
-                moved = move_new_pdf(TEMP_DOWNLOAD_DIR, before, target_pdf)
-
-            if moved:
-                print("Found")
-                print(f"Saved: {target_pdf}")
+            has_rows = True
+        except TimeoutException:
+            has_rows = False
+            if driver.find_elements(By.XPATH, TRY_LATER_MODAL):
+                close_try_later_modal(driver)
+                slot.outcome = "throttled"
             else:
-                print("Not found")
+                slot.outcome = "empty"
+
+    if not has_rows:
+        print(f"{tag}Not found" + (" (throttled)" if slot.outcome == "throttled" else ""))
+        if slot.outcome == "throttled":
+            for result in results.values():
+                result["Status"] = "error"
+        reset_search(session, phases, year_filter(years))
+        return list(results.values())
+
+    with phases.time("row_scan"):
+        rows = read_result_rows(driver)
+        # only the first page is read; plans missing from a partial list are not final
+        truncated = more_result_pages(driver, rows)
+        assigned = [(year, plan, row) for year in years
+                    for plan, row in assign_rows(plans, rows, year, registry.keys, names=registry.names).items()]
+
+    for year, plan, row in assigned:
+        name, plan_key = registry.name(plan), registry.plan_key(plan)
+        if row is None:
+            print(f"{tag}Not found: {name} ({year})" + (" (more result pages)" if truncated else ""))
+            if truncated:
+                add_year(results[plan], year, "truncated")
+            continue
+        stored = store.path(name, year, plan_key)
+        if stored:
+            print(f"{tag}Already stored: {stored}")
+            add_year(results[plan], year, "found", stored)
+            continue
 
-            if not clear_plan_name_only(driver, wait):
-                driver.refresh()
-                close_try_later_modal(driver)
-                apply_year_filter(driver, wait, TARGET_YEAR)
+        staged_pdf = store.staging_path()
+        moved = False
 
-            time.sleep(0.4)
+        t0 = time.perf_counter()
+        ticket = watcher.expect()
+        try:
+            clicked = click_download_row(driver, row["index"])
+        except WebDriverException:
+            watcher.cancel(ticket)
+            raise
+
+        if clicked:
+            moved = watcher.collect(ticket, staged_pdf, timeout=phases.timeout("download", 40))
+            phases.record("download", time.perf_counter() - t0, ok=moved, key=plan,
+                          size=staged_pdf.stat().st_size if moved else 0)
+            if not moved:
+                rate.signal("timeout")
+        else:
+            watcher.cancel(ticket)
+
+        if moved:
+            target_pdf = store.put(name, year, staged_pdf, plan_key)
+            print(f"{tag}Found ({year})")
+            print(f"{tag}Saved: {target_pdf}")
+            add_year(results[plan], year, "found", target_pdf)
+        else:
+            print(f"{tag}Not found: {name} ({year})")
+            add_year(results[plan], year, "download_failed" if clicked else "not_found")
+
+    reset_search(session, phases, year_filter(years))
+    return list(results.values())
+
+
+def run_session(groups, pool: SessionPool, phases: PhaseStats, rate: RateController, store: FilingStore,
+                tag: str = "", on_result=None, telemetry: Step2Telemetry | None = None,
+                registry: PlanRegistry | None = None, years: list[str] = (TARGET_YEAR,)) -> list[dict]:
+    session = pool.acquire()
+    results = []
+
+    try:
+        for query, plans in groups:
+            def search(query, plans):
+                try:
+                    return process_group(session, query, plans, phases, rate, store, tag=tag,
+                                         registry=registry, years=years)
+                except WebDriverException as e:
+                    print(f"{tag}Error on {query}: {e.__class__.__name__}")
+                    session.dirty = True
+                    return [new_result(plan, query, "error", registry) for plan in plans]
+
+            with phases.capture() as spans:
+                group_results = with_name_fallback(search, query, plans, registry or PlanRegistry())
+            if telemetry:
+                telemetry.group_done(query, group_results, spans, tag)
+            for result in group_results:
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+            session.plans += len(plans)
+            if session.dirty or session.plans >= pool.max_plans:
+                session = pool.swap(session)
 
     finally:
-        driver.quit()
+        print(f"{tag}Download latency: {session.watcher.stats()}")
+        pool.release(session)
+
+    return results
+
+
+def _shared(groups):
+    """
+    Wrap groups in one iterator that several sessions can pull from, so each
+    group goes to whichever session is free next.
+    """
+    lock = threading.Lock()
+    it = iter(groups)
+
+    def pull():
+        while True:
+            with lock:
+                group = next(it, None)
+            if group is None:
+                return
+            yield group
+
+    return pull
+
+
+def run_pool(groups, workers: int, phases: PhaseStats, rate: RateController, store: FilingStore,
+             headless: bool = True,
+             on_result=None, telemetry: Step2Telemetry | None = None, spares: int = SESSION_SPARES,
+             recycle_after: int = RECYCLE_AFTER, registry: PlanRegistry | None = None,
+             years: list[str] = (TARGET_YEAR,)) -> list[dict]:
+    """
+    Run N worker threads, each driving one browser session from a warm
+    SessionPool and pulling query groups from a shared feed; groups may be a
+    generator that is still producing. Selenium work is I/O bound (the
+    browser is a separate process), so one thread drives each session.
+    """
+    if isinstance(groups, list):
+        workers = min(workers, len(groups))
+    workers = max(1, min(workers, MAX_WORKERS))
+    pull = _shared(groups)
+
+    print(f"Starting {workers} browser sessions (+{spares} warm spare) ...")
+    pool = SessionPool(
+        factory=lambda download_dir, driver_path: make_driver(download_dir, headless, driver_path),
+        prepare=lambda session: load_search_page(session.driver, session.wait, rate, year_filter(years)),
+        download_root=TEMP_DOWNLOAD_DIR, size=workers, spares=spares, max_plans=recycle_after,
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_session, pull(), pool, phases, rate, store, f"[w{i}] " if workers > 1 else "",
+                                on_result, telemetry, registry, years)
+                for i in range(workers)
+            ]
+            return [r for f in futures for r in f.result()]
+    finally:
+        pool.close()
+        print(f"Session pool: {pool.stats()}")
+
+
+def process_group_http(client: EfastHttpClient, query: str, plans: list[str], phases: PhaseStats,
+                       rate: RateController, store: FilingStore, tag: str = "",
+                       registry: PlanRegistry | None = None, years: list[str] = (TARGET_YEAR,)) -> list[dict]:
+    registry = registry or PlanRegistry()
+    results = {plan: new_result(plan, query, registry=registry) for plan in plans}
+
+    print(f"\n{tag}Searching: {query} ({len(plans)} plan{'s' if len(plans) > 1 else ''})")
+
+    try:
+        with rate.slot((requests.Timeout,)) as slot:
+            try:
+                t0 = time.perf_counter()
+                with phases.time("search_submit", (requests.Timeout,)):
+                    rows, truncated = client.search(query, year_filter(years))
+            except requests.RequestException as e:
+                if is_throttled(e):
+                    slot.outcome = "throttled"
+                raise
+            # an empty answer is a plan that isn't there, unless it was also slow to come
+            usual = phases.p95("search_submit")
+            if not rows and usual is not None and time.perf_counter() - t0 > usual:
+                slot.outcome = "empty"
+    except requests.RequestException as e:
+        print(f"{tag}Error on {query}: {e.__class__.__name__}")
+        return [new_result(plan, query, "error", registry) for plan in plans]
+
+    assigned = [(year, plan, row) for year in years
+                for plan, row in assign_rows(plans, rows, year, registry.keys, names=registry.names).items()]
+    for year, plan, row in assigned:
+        name, plan_key = registry.name(plan), registry.plan_key(plan)
+        if row is None:
+            print(f"{tag}Not found: {name} ({year})" + (" (results truncated)" if truncated else ""))
+            if truncated:
+                add_year(results[plan], year, "truncated")
+            continue
+        stored = store.path(name, year, plan_key)
+        if stored:
+            print(f"{tag}Already stored: {stored}")
+            add_year(results[plan], year, "found", stored)
+            continue
+
+        staged_pdf = store.staging_path()
+        try:
+            with phases.time("download", (requests.Timeout,), key=plan) as span:
+                span["size"] = client.download(row["ack_id"], staged_pdf)
+        except requests.RequestException as e:
+            if isinstance(e, requests.Timeout) or is_throttled(e):
+                rate.signal("timeout" if isinstance(e, requests.Timeout) else "throttled")
+            print(f"{tag}Error on {name} ({year}): {e.__class__.__name__}")
+            add_year(results[plan], year, "error")
+            continue
+
+        target_pdf = store.put(name, year, staged_pdf, plan_key)
+        print(f"{tag}Found ({year})")
+        print(f"{tag}Saved: {target_pdf}")
+        add_year(results[plan], year, "found", target_pdf)
+
+    return list(results.values())
+
+
+def run_http(groups, workers: int, phases: PhaseStats, rate: RateController, store: FilingStore,
+             base_url: str = BASE_URL, on_result=None, telemetry: Step2Telemetry | None = None,
+             registry: PlanRegistry | None = None, years: list[str] = (TARGET_YEAR,)) -> list[dict]:
+    """
+    Same loop without a browser: search and download straight over HTTP,
+    with worker threads sharing one pooled keep-alive session.
+    """
+    workers = max(1, min(workers, MAX_WORKERS))
+    client = EfastHttpClient(base_url, pool_size=workers)
+    # each thread pulls its next group only when it is free, so the feed's order and budget hold
+    pull = _shared(groups)
+
+    def work(feed):
+        results = []
+        for query, plans in feed:
+            def search(query, plans):
+                return process_group_http(client, query, plans, phases, rate, store, registry=registry, years=years)
+
+            with phases.capture() as spans:
+                group_results = with_name_fallback(search, query, plans, registry or PlanRegistry())
+            if telemetry:
+                telemetry.group_done(query, group_results, spans, threading.current_thread().name)
+            for result in group_results:
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        return results
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http") as pool:
+            futures = [pool.submit(work, pull()) for _ in range(workers)]
+            return [r for f in futures for r in f.result()]
+    finally:
+        client.close()
+
+
+class PlanFeed:
+    """
+    Turns batches of plans into query groups as the batches arrive, dropping
+    plans the ledger has already finished. A batch is either a list of plan
+    names or a plan registry frame (plan_registry.py); registry plans with a
+    key are searched by sponsor EIN when search_by is "key", which puts all
+    of a sponsor's plans into one search (plans it misses are searched again
+    by name, see with_name_fallback).
+
+    With a scheduler, groups go out best expected value first (see
+    crawl_scheduler.py) instead of in file order: the feed reads batches
+    ahead until rank_window groups are waiting, merges groups that share a
+    query, and re-ranks them all whenever new batches come in. A single
+    batch (the whole registry) is ranked as a whole. The feed stops at limit
+    plans or when the budget is used up. Plans the ledger finished for only
+    some of years are queued again.
+    """
+
+    def __init__(self, plan_batches, ledger: JobLedger, limit: int = 0, max_attempts: int = 3,
+                 only_failed: bool = False, retry_not_found: bool = False, search_by: str = "name",
+                 scheduler: CrawlScheduler | None = None, budget: CrawlBudget | None = None,
+                 years: list[str] | None = None, rank_window: int = RANK_WINDOW):
+        self.plan_batches = plan_batches
+        self.ledger = ledger
+        self.limit = limit
+        self.pending_kwargs = {"max_attempts": max_attempts, "only_failed": only_failed,
+                               "retry_not_found": retry_not_found, "years": years}
+        self.search_by = search_by
+        self.scheduler = scheduler
+        self.rank_window = rank_window
+        self.budget = budget or CrawlBudget()
+        self.registry = PlanRegistry()
+        self.queued: list[str] = []
+        self.skipped = 0
+        self.searches = 0
+        self.finished = False  # every batch was read without the limit or budget cutting the feed short
+        self.seen = set()
+
+    def query(self, plan: str) -> str:
+        key = self.registry.key(plan) if self.search_by == "key" else None
+        return f"{key[0]:09d}" if key else self.registry.search_query(plan)
+
+    def groups(self, batch) -> list[tuple[str, list[str]]]:
+        """One batch's plans that still need work, grouped by query."""
+        if isinstance(batch, pd.DataFrame):
+            batch = self.registry.add(batch)
+        # the ledger and the filing store are per plan id: one entry per plan
+        batch = [plan for plan in dict.fromkeys(batch) if plan not in self.seen]
+        self.seen.update(batch)
+
+        todo = self.ledger.pending(batch, **self.pending_kwargs)
+        self.skipped += len(batch) - len(todo)
+        return group_by_query(todo, self.query)
+
+    def __iter__(self):
+        batches = iter(self.plan_batches)
+        window: dict[str, list[str]] = {}  # query -> plans not handed out yet, in the order they go out
+        more = True
+        while True:
+            # without a scheduler, one batch at a time in file order
+            wanted = self.rank_window if self.scheduler else 1
+            added = False
+            while more and len(window) < wanted:
+                batch = next(batches, None)
+                if batch is None:
+                    more = False
+                    break
+                for query, plans in self.groups(batch):
+                    window.setdefault(query, []).extend(plans)
+                added = True
+            if not window:
+                break
+            if added and self.scheduler:
+                window = dict(self.scheduler.order(list(window.items()), self.registry.participants,
+                                                   self.registry.sponsor_key))
+
+            query = next(iter(window))
+            plans = window.pop(query)
+            if self.limit:
+                plans = plans[:self.limit - len(self.queued)]
+            if not plans or self.budget.exhausted(self.searches):
+                return
+            self.queued.extend(plans)
+            self.searches += 1
+            yield query, plans
+        self.finished = True
+
+
+def download_plans(plan_batches, workers: int = 1, backend: str = "selenium", base_url: str = BASE_URL,
+                   headless: bool = False, limit: int = LIMIT, ledger_path: str = ledger_db,
+                   max_attempts: int = 3, only_failed: bool = False, retry_not_found: bool = False,
+                   initial_rate: float = 1.0, output_file: str | None = results_csv,
+                   telemetry: Step2Telemetry | None = None, spares: int = SESSION_SPARES,
+                   recycle_after: int = RECYCLE_AFTER, search_by: str = "name", order: str = "priority",
+                   budget_searches: int = 0, budget_minutes: float = 0,
+                   store_dir: Path = OUTPUT_DIR, years: list[str] | None = None) -> pd.DataFrame:
+    """
+    Step 2 for an iterable of plan batches (name lists or plan registry
+    frames). The batches can come from a generator (e.g.
+    Get_data.stream_form5500): searches start on the first batch while later
+    ones are still being produced. With telemetry, every plan is traced and
+    the run's counters and histograms are exported.
+
+    order="priority" fetches big, likely-to-be-found plans first; with a
+    budget (searches and / or minutes) the crawl stops once it is used up;
+    the returned frame's attrs["complete"] is False then, or while plans are
+    left to retry.
+    PDFs go into the content-addressed filing store under store_dir, one per
+    plan and year. With several years, each query is searched once without a
+    year filter and every requested year's filing is taken from the same
+    result rows, instead of one search per year.
+    """
+    years = sorted(years or [TARGET_YEAR])
+    ledger = JobLedger(ledger_path)
+    store = FilingStore(store_dir)
+    scheduler = CrawlScheduler(ledger.sponsor_history()) if order == "priority" else None
+    budget = CrawlBudget(budget_searches, budget_minutes * 60)
+    feed = PlanFeed(plan_batches, ledger, limit, max_attempts, only_failed, retry_not_found, search_by,
+                    scheduler, budget, years)
+
+    def on_result(result):
+        ledger.record(result, years)
+        if scheduler:
+            scheduler.observe(result)
+
+    phases = PhaseStats()
+    rate = RateController(max_concurrency=max(1, min(workers, MAX_WORKERS)), initial_rate=initial_rate)
+    try:
+        if backend == "http":
+            results = run_http(feed, workers, phases, rate, store, base_url, on_result=on_result,
+                               telemetry=telemetry, registry=feed.registry, years=years)
+        else:
+            results = run_pool(feed, workers, phases, rate, store, headless=headless or workers > 1,
+                               on_result=on_result, telemetry=telemetry, spares=spares,
+                               recycle_after=recycle_after, registry=feed.registry, years=years)
+        # plans cut off by the limit, and failures with attempts left, are still pending
+        complete = feed.finished and not ledger.pending(list(feed.seen), **feed.pending_kwargs)
+    finally:
+        print(f"\n{feed.skipped} plans already done per {ledger_path}; "
+              f"{len(feed.queued)} plans -> {feed.searches} distinct searches for {', '.join(years)}.")
+        if budget.reason:
+            print(f"Crawl stopped early: {budget.reason}.")
+        print(f"Ledger: {ledger.summary()}")
+        print(f"Filing store: {store.stats()}")
+        print(f"Rate control: {rate.snapshot()}")
+        ledger.close()
+        store.close()
+        if telemetry:
+            telemetry.close(rate.snapshot())
+        print("\nPer-phase latency:")
+        print(phases.histogram())
+
+    # back into the order the plans were queued in
+    position = {plan: i for i, plan in enumerate(feed.queued)}
+    results.sort(key=lambda r: position[plan_id(r["Full_Plan_Name"], r["Plan_Key"])])
+
+    results_df = pd.DataFrame(results, columns=RESULT_COLUMNS)
+    results_df.attrs["complete"] = complete
+    found = (results_df["Status"] == "found").sum()
+    if output_file:
+        results_df.to_csv(output_file, index=False)
+        filings = sum(len(stored.split(";")) for stored in results_df["Years"] if stored)
+        print(f"\n{found}/{len(results_df)} plans downloaded ({filings} filings). Results saved to: {output_file}")
+    return results_df
+
+
+def main():
+    global TARGET_URL
+    parser = argparse.ArgumentParser(description="Search and download Form 5500 filings on efast")
+    parser.add_argument("--workers", type=int, default=1, help=f"parallel browser sessions (max {MAX_WORKERS})")
+    parser.add_argument("--limit", type=int, default=LIMIT, help="number of plans to process (0 = all)")
+    parser.add_argument("--headless", action="store_true", help="run Chrome headless (always on with --workers > 1)")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium",
+                        help="drive the search page in Chrome, or call the search service directly")
+    parser.add_argument("--base-url", default=BASE_URL, help="efast base URL for the http backend")
+    parser.add_argument("--url", default=TARGET_URL,
+                        help="search page for the selenium backend (e.g. a local mock_efast.py)")
+    parser.add_argument("--ledger", default=ledger_db, help="SQLite job ledger used to resume interrupted runs")
+    parser.add_argument("--max-attempts", type=int, default=3, help="retry failed plans until this many attempts")
+    parser.add_argument("--retry-not-found", action="store_true", help="also retry plans that were not found")
+    parser.add_argument("--only-failed", action="store_true", help="rerun failed plans only, skip new ones")
+    parser.add_argument("--rate", type=float, default=1.0, help="initial searches per second, adapted from there")
+    parser.add_argument("--spares", type=int, default=SESSION_SPARES,
+                        help="warm browser sessions kept ready to replace a broken one")
+    parser.add_argument("--recycle-after", type=int, default=RECYCLE_AFTER,
+                        help="plans per browser session before it is swapped out and its page reloaded")
+    parser.add_argument("--search-by", choices=["key", "name"], default="name",
+                        help="search by plan name, or keyed plans by sponsor EIN (matched on EIN + plan number, "
+                             "with a name search for the plans it misses)")
+    parser.add_argument("--order", choices=["priority", "file"], default="priority",
+                        help="fetch big, likely-to-be-found plans first, or keep the CSV's order")
+    parser.add_argument("--budget-searches", type=int, default=0, help="stop after this many searches (0 = no limit)")
+    parser.add_argument("--budget-minutes", type=float, default=0,
+                        help="stop starting new searches after this many minutes (0 = no limit)")
+    parser.add_argument("--years", type=parse_years, default=[TARGET_YEAR],
+                        help=f"filing years to download, e.g. 2019-2024 or 2021,2023 (default {TARGET_YEAR}); "
+                             "several years cost one search per plan, not one per year")
+    parser.add_argument("--trace", nargs="?", const=TRACE_FILE, default=None,
+                        help=f"append one JSON line per plan to this file (default {TRACE_FILE})")
+    parser.add_argument("--metrics", nargs="?", const=METRICS_FILE, default=None,
+                        help=f"export Prometheus text metrics to this file (default {METRICS_FILE})")
+    args = parser.parse_args()
+
+    TARGET_URL = args.url
+
+    registry = read_registry(csv_file)
+
+    telemetry = None
+    if args.trace or args.metrics:
+        telemetry = Step2Telemetry(TraceLog(args.trace) if args.trace else None,
+                                   Metrics(args.metrics) if args.metrics else None)
+
+    download_plans([registry], args.workers, args.backend, args.base_url, args.headless, args.limit,
+                   args.ledger, args.max_attempts, args.only_failed, args.retry_not_found, args.rate,
+                   telemetry=telemetry, spares=args.spares, recycle_after=args.recycle_after,
+                   search_by=args.search_by, order=args.order, budget_searches=args.budget_searches,
+                   budget_minutes=args.budget_minutes, years=args.years)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic Form 5500 generator and Step 1 ingestion benchmark.
+
+Generates f_5500_<year>_all.csv-shaped files at any scale and times every
+ingestion path of Get_data.process_form5500 on them, each in its own
+process so peak RSS is measured per path.
+
+Run with:
+    python bench_form5500.py --rows 100000 1000000 10000000
+    python bench_form5500.py --rows 1000000 --encoding latin1 --paths streaming cache_warm
+    python bench_form5500.py --rows 1000000 --encoding mixed
+
+Every file has accented sponsor names. A "mixed" file is UTF-8 except for
+its last MIXED_TAIL_ROWS rows, which are latin1 (as when dumps from
+different sources are concatenated), so only a detector that reads the
+whole file picks the right encoding.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = Path(".bench_data")
+# cache_columns: typed column cache only (registry cache dropped); cache_warm: registry cache
+PATHS = ["legacy", "full", "streaming", "cache_cold", "cache_columns", "cache_warm"]
+
+# ---------- generator ----------
+FIRST_WORDS = [
+    "ALLIANCE", "AMERISTAR", "SUMMIT", "PIONEER", "RIVERSIDE", "NORTHSTAR", "GREENFIELD", "BLUE RIDGE",
+    "HERITAGE", "PACIFIC", "ATLANTIC", "MIDWEST", "EAGLE", "LIBERTY", "CORNERSTONE", "KEYSTONE",
+    "VALLEY", "COASTAL", "METRO", "PREMIER", "UNITED", "FIRST", "GOLDEN", "SILVER", "CEDAR",
+]
+SECOND_WORDS = [
+    "SHIPPERS", "HOME CARE SERVICES", "DENTAL GROUP", "CONSTRUCTION", "LOGISTICS", "ENGINEERING",
+    "MEDICAL ASSOCIATES", "HOLDINGS", "TECHNOLOGIES", "MANUFACTURING", "FOODS", "AUTO GROUP",
+    "PSYCHIATRIC SERVICES", "LAW FIRM", "CONSULTING", "ELECTRIC", "PLUMBING", "SCHOOL DISTRICT",
+]
+ACCENTED = ["CAFÉ", "MUÑOZ", "PEÑA", "JOSÉ", "GARCÍA", "RENÉE"]
+# UTF-8 files also get names latin1 cannot encode
+ACCENTED_UTF8 = ACCENTED + ["ŁUKASZ", "DVOŘÁK", "ŞAHIN"]
+ACCENTED_SHARE = 0.002
+MIXED_TAIL_ROWS = 1000
+SUFFIXES = ["INC.", "LLC", "CORP", "CO.", "LTD", "P.C.", ""]
+# (plan type, weight) - roughly the mix of a yearly dump
+PLAN_TYPES = [
+    ("401(K) PLAN", 0.30),
+    ("401(K) PROFIT SHARING PLAN & TRUST", 0.17),
+    ("401(K) SAVINGS PLAN", 0.08),
+    ("403(B) PLAN", 0.04),
+    ("403(B) RETIREMENT PLAN", 0.03),
+    ("PROFIT SHARING PLAN", 0.10),
+    ("DEFINED BENEFIT PENSION PLAN", 0.06),
+    ("CASH BALANCE PLAN", 0.04),
+    ("HEALTH AND WELFARE PLAN", 0.14),
+    ("EMPLOYEE STOCK OWNERSHIP PLAN", 0.04),
+]
+EXTRA_COLUMNS = ["FORM_PLAN_YEAR_BEGIN_DATE", "FORM_TAX_PRD", "TYPE_PLAN_ENTITY_CD", "SPONSOR_DFE_NAME",
+                 "SPONS_DFE_MAIL_US_CITY", "SPONS_DFE_MAIL_US_STATE", "TOT_PARTCP_BOY_CNT",
+                 "TOT_ACTIVE_PARTCP_CNT", "TYPE_PENSION_BNFT_CODE", "DATE_RECEIVED"]
+
+
+def _chunk(rng: np.random.Generator, start: int, n: int, accented_share: float, year: int,
+           accented: list[str] = ACCENTED) -> pd.DataFrame:
+    # a sponsor pool smaller than the row count gives realistic repeats (amended / duplicate filings)
+    n_sponsors = max(1000, (start + n) // 3)
+    sponsor = rng.integers(0, n_sponsors, n)
+    first = np.array(FIRST_WORDS, dtype=object)[sponsor % len(FIRST_WORDS)]
+    # accented sponsors are fixed per sponsor, so all their filings carry the same name
+    accent = sponsor * 7919 % 10_000 < accented_share * 10_000
+    first[accent] = np.array(accented, dtype=object)[sponsor[accent] % len(accented)]
+    second = np.array(SECOND_WORDS, dtype=object)[(sponsor // len(FIRST_WORDS)) % len(SECOND_WORDS)]
+    suffix = np.array(SUFFIXES, dtype=object)[sponsor % len(SUFFIXES)]
+    sponsor_name = pd.Series(first + " " + second + " " + (sponsor % 997).astype(str) + " " + suffix).str.strip()
+
+    types, weights = zip(*PLAN_TYPES)
+    plan_type = rng.choice(np.array(types, dtype=object), n, p=np.array(weights) / sum(weights))
+    plan_name = sponsor_name + " " + plan_type
+    # mixed casing, as in real filings, but the same for every filing of a sponsor
+    lower = sponsor % 20 == 0
+    plan_name[lower] = plan_name[lower].str.title()
+    # one plan number per plan type of a sponsor: pension plans from 001, welfare plans from 501
+    plan_number = 1 + pd.Series(plan_type).map({t: i for i, t in enumerate(types)}).to_numpy()
+    plan_number[plan_type == "HEALTH AND WELFARE PLAN"] = 501
+
+    df = pd.DataFrame({
+        "ACK_ID": [f"{year}0101{start + i:012d}NAL{i % 10}" for i in range(n)],
+        "PLAN_NAME": plan_name,
+        "SPONS_DFE_EIN": (100000000 + sponsor * 37 % 899999999).astype(str),
+        "SPONS_DFE_PN": plan_number.astype(str),
+    })
+    for col in EXTRA_COLUMNS:
+        df[col] = rng.integers(0, 10000, n) if col.endswith("CNT") else "X" * 8
+    df["SPONSOR_DFE_NAME"] = sponsor_name
+    return df
+
+
+def generate_form5500(path: Path, rows: int, encoding: str = "utf-8", accented_share: float = ACCENTED_SHARE,
+                      year: int = 2024, seed: int = 0, chunk_rows: int = 500_000) -> Path:
+    """
+    Write a synthetic dump chunk by chunk, so even 10M rows need little
+    memory. encoding is "utf-8", "latin1" or "mixed" (see the module
+    docstring).
+    """
+    rng = np.random.default_rng(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tail = min(MIXED_TAIL_ROWS, rows) if encoding == "mixed" else 0
+    # (first row, rows, encoding): the mixed file's latin1 tail always holds accented names
+    parts = [(start, min(chunk_rows, rows - tail - start), "latin1" if encoding == "latin1" else "utf-8")
+             for start in range(0, rows - tail, chunk_rows)]
+    if tail:
+        parts.append((rows - tail, tail, "latin1"))
+    with open(path, "wb") as f:
+        for start, n, part_encoding in parts:
+            share = max(accented_share, 0.1) if start >= rows - tail else accented_share
+            accented = ACCENTED_UTF8 if part_encoding == "utf-8" else ACCENTED
+            chunk = _chunk(rng, start, n, share, year, accented)
+            f.write(chunk.to_csv(index=False, header=start == 0).encode(part_encoding))
+    return path
+
+
+# ---------- one measured run (in a child process) ----------
+def _legacy(file_path: str, output_file: str):
+    # the original Step 1: full read with every column, latin1 re-read on failure
+    try:
+        df = pd.read_csv(file_path, encoding="utf-8", low_memory=False)
+    except UnicodeDecodeError:
+        df = pd.read_csv(file_path, encoding="latin1", low_memory=False)
+    filtered = df[df["PLAN_NAME"].str.contains(r"401\(k\)|403\(b\)", case=False, na=False, regex=True)]
+    pd.DataFrame(filtered["PLAN_NAME"].unique(), columns=["Full_Plan_Name"]).to_csv(output_file, index=False)
+
+
+def run_one(path_name: str, file_path: str) -> dict:
+    import Get_data
+
+    out = tempfile.NamedTemporaryFile(suffix=".csv", delete=False).name
+    t0 = time.perf_counter()
+    if path_name == "legacy":
+        _legacy(file_path, out)
+    elif path_name == "full":
+        Get_data.process_form5500(file_path, output_file=out)
+    elif path_name == "streaming":
+        Get_data.process_form5500(file_path, chunksize=Get_data.CHUNKSIZE, output_file=out)
+    else:
+        Get_data.process_form5500(file_path, chunksize=Get_data.CHUNKSIZE, output_file=out, use_cache=True)
+    wall = time.perf_counter() - t0
+
+    plans = len(pd.read_csv(out))
+    os.remove(out)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+    return {"wall_s": wall, "peak_rss_mb": peak_mb, "plans": plans}
+
+
+def measure(path_name: str, file_path: Path, rows: int) -> dict:
+    proc = subprocess.run(
+        [sys.executable, __file__, "--run-one", path_name, str(file_path)],
+        capture_output=True, text=True, check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result.update(path=path_name, rows=rows, rows_per_s=rows / result["wall_s"])
+    return result
+
+
+def clear_cache_for(file_path: Path, kind: str = ""):
+    import Get_data
+    if not Path(Get_data.CACHE_DIR).exists():
+        return
+    stem = file_path.stem
+    pattern = f"{stem}__*__{kind}_v*.arrow" if kind else f"{stem}__*.arrow"
+    for p in Path(Get_data.CACHE_DIR).glob(pattern):
+        p.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Step 1 ingestion on synthetic Form 5500 dumps")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--encoding", choices=["utf-8", "latin1", "mixed"], default="utf-8",
+                        help="mixed: UTF-8 with a latin1 tail; Step 1 must detect latin1")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=PATHS)
+    parser.add_argument("--keep", action="store_true", help="keep generated files for later runs")
+    parser.add_argument("--json", default=None, help="also write the results as JSON to this file")
+    parser.add_argument("--run-one", nargs=2, metavar=("PATH", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        # child mode: keep Get_data's prints off stdout's last line
+        print(json.dumps(run_one(*args.run_one)))
+        return
+
+    import Get_data
+
+    results = []
+    for rows in args.rows:
+        file_path = BENCH_DIR / f"f_5500_synth_{rows}_{args.encoding.replace('-', '')}.csv"
+        if not file_path.exists():
+            print(f"Generating {rows:,} rows ({args.encoding}) -> {file_path}")
+            t0 = time.perf_counter()
+            generate_form5500(file_path, rows, encoding=args.encoding)
+            print(f"  generated in {time.perf_counter() - t0:.1f}s, {file_path.stat().st_size / 1024 ** 2:.0f} MB")
+        expected = "utf-8" if args.encoding == "utf-8" else "latin1"
+        detected = Get_data.detect_encoding(file_path)
+        print(f"  encoding detected: {detected}" + ("" if detected == expected else f" (expected {expected})"))
+
+        counts = {}
+        for path_name in args.paths:
+            if path_name == "cache_cold":
+                clear_cache_for(file_path)
+            elif path_name == "cache_columns":
+                clear_cache_for(file_path, "registry")
+            r = measure(path_name, file_path, rows)
+            results.append(r)
+            counts[path_name] = r["plans"]
+            print(f"  {path_name:>13}: {r['wall_s']:8.2f}s  {r['peak_rss_mb']:8.0f} MB  "
+                  f"{r['rows_per_s']:12,.0f} rows/s  ({r['plans']:,} plans)")
+        # every path must select the same plans, or its timing is not comparable
+        if "full" in counts:
+            for path_name, plans in counts.items():
+                if plans != counts["full"]:
+                    print(f"  WARNING: {path_name} selected {plans:,} plans, full selected {counts['full']:,}")
+
+        if not args.keep:
+            clear_cache_for(file_path)
+            file_path.unlink()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"Results saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+End-to-end Step 2 throughput against the local mock efast.
+
+Starts mock_efast.py with the requested faults (latency, throttling modals,
+failing downloads), runs Searching and Downloading.py against it in a
+scratch directory, and reports plans per minute and the failure rates from
+its step2_results.csv. A share of the plans can be left off the mock site
+to check that they come back as not_found rather than as false matches.
+
+Run with:
+    python bench_step2.py --plans 100 --workers 4 --latency 0.3 --throttle-rate 0.05
+    python bench_step2.py --backend http --plans 2000 --workers 8 --download-error-rate 0.02
+    python bench_step2.py --backend http --plans 500 --years 2020-2024
+"""
+
+import argparse
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from mock_efast import PAGE_PATH, filings_for, start_server
+from plan_registry import NO_KEY, plan_id, plan_ids, read_registry
+
+SCRAPER = Path(__file__).resolve().parent / "Searching and Downloading.py"
+STATUSES = ["found", "not_found", "download_failed", "truncated", "error"]
+# every plan on the mock site has a filing for each of these; --years picks a subset
+SITE_YEARS = [str(year) for year in range(2019, 2025)]
+
+
+def run_benchmark(plans: int = 100, workers: int = 1, backend: str = "selenium", latency: float = 0.0,
+                  throttle_rate: float = 0.0, download_error_rate: float = 0.0, missing_rate: float = 0.1,
+                  rate: float = 5.0, csv_path: str = "filtered_401k_403b_plans.csv", seed: int = 0,
+                  keep: bool = False, verbose: bool = False, years: str = "2024") -> dict:
+    registry = read_registry(csv_path).head(plans).reset_index(drop=True)
+    # plans sharing a name are told apart by plan id, as in Step 2
+    ids = plan_ids(registry)
+    rng = random.Random(seed)
+    missing = {plan for plan in ids if rng.random() < missing_rate}
+    filings = filings_for(registry[~ids.isin(missing)], years=SITE_YEARS)
+
+    server, base_url = start_server(filings, latency=latency, throttle_rate=throttle_rate,
+                                    download_error_rate=download_error_rate, seed=seed)
+    # the scraper keeps its CSVs, ledger and downloads relative to the working directory
+    workdir = Path(tempfile.mkdtemp(prefix="step2_bench_"))
+    registry.to_csv(workdir / "filtered_401k_403b_plans.csv", index=False)
+
+    cmd = [sys.executable, str(SCRAPER), "--limit", "0", "--workers", str(workers),
+           "--backend", backend, "--rate", str(rate), "--years", years]
+    cmd += ["--base-url", base_url] if backend == "http" else ["--url", base_url + PAGE_PATH, "--headless"]
+
+    print(f"Running {len(ids)} plans ({len(missing)} not on the site) against {base_url} "
+          f"with {workers} {backend} worker{'s' if workers > 1 else ''} ...")
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.run(cmd, cwd=workdir, capture_output=True, text=True)
+    finally:
+        server.shutdown()
+    elapsed = time.perf_counter() - t0
+    requests_served = dict(server.RequestHandlerClass.stats)
+
+    if verbose or proc.returncode:
+        print(proc.stdout[-4000:])
+        print(proc.stderr[-4000:])
+    results_path = workdir / "step2_results.csv"
+    results = (pd.read_csv(results_path) if results_path.exists()
+               else pd.DataFrame(columns=["Full_Plan_Name", "Plan_Key", "Status"]))
+    if keep:
+        print(f"Scratch directory kept at: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    counts = results["Status"].value_counts()
+    result_ids = [plan_id(name, NO_KEY if pd.isna(key) else int(key))
+                  for name, key in zip(results["Full_Plan_Name"], results["Plan_Key"])]
+    served = ~pd.Series(result_ids, index=results.index, dtype=object).isin(missing)
+    done = len(results)
+    report = {
+        "plans": len(ids),
+        "completed": done,
+        "elapsed_s": round(elapsed, 1),
+        "plans_per_min": round(done / elapsed * 60, 1) if elapsed else 0.0,
+        **{f"{s}_rate": round(counts.get(s, 0) / done, 3) if done else 0.0 for s in STATUSES},
+        # plans on the site that were not downloaded, and plans not on the site that were
+        "missed_rate": round((results[served]["Status"] != "found").mean(), 3) if served.any() else 0.0,
+        "false_match_rate": round((results[~served]["Status"] == "found").mean(), 3) if (~served).any() else 0.0,
+        "years_per_found_plan": round(results.loc[results["Status"] == "found", "Years"].astype(str)
+                                      .str.count(";").add(1).mean(), 2) if "Years" in results else 0.0,
+        "exit_code": proc.returncode,
+        "requests": requests_served,
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test Step 2 against the local mock efast")
+    parser.add_argument("--plans", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds added to every mock request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of searches throttled")
+    parser.add_argument("--download-error-rate", type=float, default=0.0, help="share of downloads that fail")
+    parser.add_argument("--missing-rate", type=float, default=0.1, help="share of plans left off the mock site")
+    parser.add_argument("--rate", type=float, default=5.0, help="scraper's initial searches per second")
+    parser.add_argument("--csv", default="filtered_401k_403b_plans.csv")
+    parser.add_argument("--years", default="2024", help="filing years to download, e.g. 2020-2024")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--verbose", action="store_true", help="print the scraper's output")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.plans, args.workers, args.backend, args.latency, args.throttle_rate,
+                           args.download_error_rate, args.missing_rate, args.rate, args.csv,
+                           keep=args.keep, verbose=args.verbose, years=args.years)
+    for key, value in report.items():
+        print(f"  {key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cached driver resolution and a pool of warm browser sessions for Step 2.
+
+resolve_driver() finds chromedriver without touching the network when it
+can: the CHROMEDRIVER environment variable, the path cached by an earlier
+run, or chromedriver on PATH. Only then is webdriver_manager asked, and its
+answer is cached for next time.
+
+SessionPool keeps sessions warm on background threads: browser started,
+page loaded and prepared (for Step 2: modal closed, year filter applied).
+A worker whose page broke, or whose session has served max_plans plans,
+swaps in a warm spare right away. The old session is recycled in the
+background by preparing its page again, and only rebuilt from scratch if
+that fails or after max_recycles recycles (to bound browser memory).
+"""
+
+import itertools
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from download_watcher import DownloadWatcher
+
+DRIVER_CACHE = Path(".chromedriver_path")
+
+
+def resolve_driver(refresh: bool = False) -> str:
+    """Path to a chromedriver binary; refresh skips the local answers (e.g. after a version mismatch)."""
+    if not refresh:
+        env_path = os.environ.get("CHROMEDRIVER")
+        if env_path and os.access(env_path, os.X_OK):
+            return env_path
+        if DRIVER_CACHE.exists():
+            cached = DRIVER_CACHE.read_text().strip()
+            if cached and os.access(cached, os.X_OK):
+                return cached
+        on_path = shutil.which("chromedriver")
+        if on_path:
+            return on_path
+
+    from webdriver_manager.chrome import ChromeDriverManager
+    path = ChromeDriverManager().install()
+    DRIVER_CACHE.write_text(path)
+    return path
+
+
+class BrowserSession:
+    def __init__(self, sid: int, driver, download_dir: Path):
+        self.sid = sid
+        self.driver = driver
+        self.wait = WebDriverWait(driver, 20)
+        self.watcher = DownloadWatcher(download_dir)
+        self.plans = 0
+        self.recycles = 0
+        # set when the page is in an unknown state (failed reset, WebDriverException)
+        self.dirty = False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except WebDriverException:
+            pass
+        self.watcher.close()
+
+
+class SessionPool:
+    """
+    factory(download_dir, driver_path) -> new driver
+    prepare(session) -> load and prepare the page; raises WebDriverException on failure
+    """
+
+    def __init__(self, factory, prepare, download_root: Path, size: int, spares: int = 1,
+                 max_plans: int = 200, max_recycles: int = 5, driver_path: str | None = None):
+        self.factory = factory
+        self.prepare = prepare
+        self.download_root = Path(download_root)
+        self.max_plans = max_plans
+        self.max_recycles = max_recycles
+        self.driver_path = driver_path or resolve_driver()
+
+        self._ready = queue.Queue()
+        self._jobs = queue.Queue()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._sessions = set()
+        self._stats = {"built": 0, "recycled": 0, "rebuilt": 0, "swaps": 0, "failed": 0}
+        self._swap_waits = []
+
+        # size sessions for the workers plus the warm spares, all started in parallel
+        total = size + spares
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(total)]
+        for t in self._threads:
+            t.start()
+        for _ in range(total):
+            self._jobs.put(("build", None))
+
+    # ---------- worker side ----------
+    def acquire(self) -> BrowserSession:
+        item = self._ready.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def swap(self, session: BrowserSession) -> BrowserSession:
+        """Hand back a broken or worn-out session and get a warm one."""
+        t0 = time.perf_counter()
+        self._jobs.put(("recycle", session))
+        fresh = self.acquire()
+        with self._lock:
+            self._stats["swaps"] += 1
+            self._swap_waits.append(time.perf_counter() - t0)
+        return fresh
+
+    def release(self, session: BrowserSession):
+        self._ready.put(session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._swap_waits)
+        if waits:
+            stats["swap_wait_ms_p50"] = round(1000 * waits[len(waits) // 2], 1)
+            stats["swap_wait_ms_max"] = round(1000 * waits[-1], 1)
+        return stats
+
+    def close(self):
+        for _ in self._threads:
+            self._jobs.put(None)
+        for t in self._threads:
+            t.join()
+        with self._lock:
+            sessions = list(self._sessions)
+            self._sessions.clear()
+        for session in sessions:
+            session.quit()
+
+    # ---------- background side ----------
+    def _work(self):
+        failures = 0
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            kind, session = job
+            try:
+                if kind == "recycle":
+                    self._recycle(session)
+                else:
+                    self._ready.put(self._build())
+                failures = 0
+            except Exception as e:
+                failures += 1
+                with self._lock:
+                    self._stats["failed"] += 1
+                # a browser that failed to start may start next time, anything else will not
+                if failures >= 3 or not isinstance(e, WebDriverException):
+                    # give up on this slot; a waiting worker gets the error instead of hanging
+                    self._ready.put(e)
+                else:
+                    self._jobs.put(("build", None))
+
+    def _build(self) -> BrowserSession:
+        sid = next(self._ids)
+        download_dir = self.download_root / f"session_{sid}"
+        try:
+            driver = self.factory(download_dir, self.driver_path)
+        except SessionNotCreatedException:
+            # usually a cached chromedriver that no longer matches the installed Chrome
+            self.driver_path = resolve_driver(refresh=True)
+            driver = self.factory(download_dir, self.driver_path)
+        session = BrowserSession(sid, driver, download_dir)
+        with self._lock:
+            self._sessions.add(session)
+        try:
+            self.prepare(session)
+        except Exception:
+            self._discard(session)
+            raise
+        with self._lock:
+            self._stats["built"] += 1
+        return session
+
+    def _recycle(self, session: BrowserSession):
+        if session.recycles < self.max_recycles:
+            try:
+                self.prepare(session)
+                session.recycles += 1
+                session.plans = 0
+                session.dirty = False
+                with self._lock:
+                    self._stats["recycled"] += 1
+                self._ready.put(session)
+                return
+            except WebDriverException:
+                pass
+        self._discard(session)
+        with self._lock:
+            self._stats["rebuilt"] += 1
+        self._ready.put(self._build())
+
+    def _discard(self, session: BrowserSession):
+        with self._lock:
+            self._sessions.discard(session)
+        session.quit()
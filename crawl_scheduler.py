@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+Priority order and crawl budget for Step 2.
+
+Step 2 used to walk the plans in file order. The scheduler instead ranks
+query groups by expected value per request:
+
+    value(plan)  = 1 + log1p(participants)          (bigger plans matter more)
+    p_hit(sponsor) = (found + prior * base_rate) / (searched + prior)
+    score(group)   = p_hit * sum(value) / (1 + p_hit * len(plans))
+
+p_hit comes from the ledger's per-sponsor history, keyed on the registry's
+Sponsor_Key so that it carries over between searches by name and by EIN
+(an EIN query never repeats across sponsors, a query-keyed history would
+stay empty), smoothed towards the overall hit rate so a query seen once is not trusted
+blindly. The denominator is the expected number of requests: one search,
+plus one download per expected hit. Results of the current run are fed back
+with observe(), so batches that arrive later (streaming from Step 1) are
+ranked with what this run has learned so far.
+
+CrawlBudget stops the crawl after a number of searches or a wall-clock
+duration, whichever comes first; groups already started finish normally.
+"""
+
+import math
+import threading
+import time
+
+DEFAULT_HIT_RATE = 0.5
+
+
+class CrawlScheduler:
+    def __init__(self, history: dict[str, tuple[int, int]] | None = None, prior: float = 2.0):
+        self.prior = prior
+        self._lock = threading.Lock()
+        self._history = {sponsor: list(counts) for sponsor, counts in (history or {}).items()}
+        self._found = sum(found for found, _ in self._history.values())
+        self._searched = sum(searched for _, searched in self._history.values())
+
+    @property
+    def base_rate(self) -> float:
+        if self._searched < 10:
+            return DEFAULT_HIT_RATE
+        return self._found / self._searched
+
+    def hit_probability(self, sponsor: str) -> float:
+        with self._lock:
+            found, searched = self._history.get(sponsor, (0, 0))
+            return (found + self.prior * self.base_rate) / (searched + self.prior)
+
+    def observe(self, result: dict):
+        """Feed one plan result back in; only final answers (found / not_found) count."""
+        if result["Status"] not in ("found", "not_found"):
+            return
+        hit = result["Status"] == "found"
+        with self._lock:
+            counts = self._history.setdefault(result.get("Sponsor_Key") or result["Query"], [0, 0])
+            counts[0] += hit
+            counts[1] += 1
+            self._found += hit
+            self._searched += 1
+
+    @staticmethod
+    def value(participants: int) -> float:
+        return 1.0 + math.log1p(max(0, participants))
+
+    def score(self, sponsor: str, plans: list[str], participants) -> float:
+        p_hit = self.hit_probability(sponsor)
+        return p_hit * sum(self.value(participants(plan)) for plan in plans) / (1 + p_hit * len(plans))
+
+    def order(self, groups: list[tuple[str, list[str]]], participants, sponsor=None) -> list[tuple[str, list[str]]]:
+        """
+        groups, highest score first; participants(plan) -> int and
+        sponsor(plan) -> Sponsor_Key (the query itself without it). Ties keep
+        their input order.
+        """
+        def key(group):
+            query, plans = group
+            return -self.score(sponsor(plans[0]) if sponsor else query, plans, participants)
+        return sorted(groups, key=key)
+
+
+class CrawlBudget:
+    """max_searches / max_seconds of 0 mean unlimited."""
+
+    def __init__(self, max_searches: int = 0, max_seconds: float = 0):
+        self.max_searches = max_searches
+        self.max_seconds = max_seconds
+        self.started = time.monotonic()
+        self.reason = ""
+
+    def exhausted(self, searches: int) -> bool:
+        if self.max_searches and searches >= self.max_searches:
+            self.reason = f"search budget of {self.max_searches} used"
+        elif self.max_seconds and time.monotonic() - self.started >= self.max_seconds:
+            self.reason = f"time budget of {self.max_seconds / 60:g} min used"
+        return bool(self.reason)
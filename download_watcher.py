@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+Event-driven download completion for Step 2.
+
+Chrome writes each download as <name>.crdownload and renames it to <name>.pdf
+once it is complete. DownloadWatcher listens for that rename through
+filesystem events (watchdog: inotify / FSEvents / ReadDirectoryChanges) and
+hands every finalized PDF to exactly one waiting request, in click order.
+Without watchdog it falls back to a light background scan of the directory.
+
+A request that times out keeps its place only for files whose .crdownload
+had already started by then: such a late file is dropped, while anything
+started afterwards goes to the next live request.
+
+Usage:
+    watcher = DownloadWatcher(download_dir)
+    ticket = watcher.expect()        # right before clicking download
+    ...click...
+    watcher.collect(ticket, target)  # or watcher.cancel(ticket) if no click
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
+
+
+class _Ticket:
+    __slots__ = ("t0", "path", "abandoned_at")
+
+    def __init__(self):
+        self.t0 = time.monotonic()
+        self.path = None
+        self.abandoned_at = None
+
+
+class DownloadWatcher:
+    def __init__(self, download_dir: Path, poll_interval: float = 0.2):
+        self.download_dir = Path(download_dir).resolve()
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = poll_interval
+        self.latencies = []
+        self.stray = 0
+
+        self._cond = threading.Condition()
+        self._pending = deque()
+        # .crdownload name -> when it was first seen; carried over Chrome's renames
+        self._started = {}
+        # files already lying around are not ours
+        self._seen = {name for name in os.listdir(self.download_dir) if name.endswith(".pdf")}
+        self._stop = threading.Event()
+
+        if HAS_WATCHDOG:
+            self._observer = Observer()
+            self._observer.schedule(_Handler(self), str(self.download_dir), recursive=False)
+            self._observer.start()
+        else:
+            self._observer = None
+            self._poller = threading.Thread(target=self._poll, daemon=True)
+            self._poller.start()
+
+    # ---------- producer side ----------
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            with os.scandir(self.download_dir) as it:
+                names = [e.name for e in it]
+            for name in names:
+                if name.endswith(".crdownload"):
+                    self._began(self.download_dir / name)
+            for name in names:
+                if name.endswith(".pdf") and name not in self._seen:
+                    # the partial file's name is unknown here; the oldest one that went away stands in
+                    self._finalized(self.download_dir / name, self._oldest_started(names))
+
+    def _oldest_started(self, names: list[str]) -> float | None:
+        with self._cond:
+            gone = [name for name in self._started if name not in names]
+            started = [self._started.pop(name) for name in gone]
+        return min(started) if started else None
+
+    def _began(self, path: Path):
+        with self._cond:
+            self._started.setdefault(path.name, time.monotonic())
+
+    def _renamed(self, src: Path, dest: Path):
+        with self._cond:
+            started = self._started.pop(src.name, None)
+            if dest.suffix == ".crdownload":
+                self._started[dest.name] = started or time.monotonic()
+        if dest.suffix == ".pdf":
+            self._finalized(dest, started)
+
+    def _finalized(self, path: Path, started: float | None = None):
+        with self._cond:
+            if path.name in self._seen:
+                return
+            self._seen.add(path.name)
+
+            now = time.monotonic()
+            # a download that started (or, if its start went unseen, finished) after a request gave up
+            # is not that request's late file
+            started = started if started is not None else now
+            while self._pending and self._pending[0].abandoned_at is not None \
+                    and self._pending[0].abandoned_at <= started:
+                self._pending.popleft()
+
+            if not self._pending:
+                self.stray += 1
+                return
+
+            ticket = self._pending.popleft()
+            if ticket.abandoned_at is not None:
+                # a late file for a request that already gave up: drop it
+                self._seen.discard(path.name)
+                path.unlink(missing_ok=True)
+                return
+
+            ticket.path = path
+            self.latencies.append(now - ticket.t0)
+            self._cond.notify_all()
+
+    # ---------- consumer side ----------
+    def expect(self) -> _Ticket:
+        ticket = _Ticket()
+        with self._cond:
+            self._pending.append(ticket)
+        return ticket
+
+    def cancel(self, ticket: _Ticket):
+        with self._cond:
+            if ticket in self._pending:
+                self._pending.remove(ticket)
+
+    def collect(self, ticket: _Ticket, target_path: Path, timeout: float = 40) -> bool:
+        """Wait for the ticket's file and move it to target_path."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: ticket.path is not None, timeout):
+                # keep the slot for a download already under way, so its late file isn't given to the next request
+                ticket.abandoned_at = time.monotonic()
+                return False
+
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(ticket.path, target_path)
+        with self._cond:
+            self._seen.discard(ticket.path.name)
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            lat = sorted(self.latencies)
+        if not lat:
+            return {"downloads": 0, "stray": self.stray}
+        return {
+            "downloads": len(lat),
+            "mean_s": round(sum(lat) / len(lat), 3),
+            "p50_s": round(lat[len(lat) // 2], 3),
+            "p95_s": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 3),
+            "max_s": round(lat[-1], 3),
+            "stray": self.stray,
+        }
+
+    def close(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+
+if HAS_WATCHDOG:
+    class _Handler(FileSystemEventHandler):
+        def __init__(self, watcher: DownloadWatcher):
+            self.watcher = watcher
+
+        def _ours(self, path) -> Path | None:
+            path = Path(os.fsdecode(path))
+            # moves out of the directory (our own collect) also show up here
+            return path if path.parent == self.watcher.download_dir else None
+
+        def on_moved(self, event):
+            src, dest = self._ours(event.src_path), self._ours(event.dest_path)
+            if dest is not None and dest.suffix in (".pdf", ".crdownload"):
+                self.watcher._renamed(src or Path(os.fsdecode(event.src_path)), dest)
+
+        def on_created(self, event):
+            path = None if event.is_directory else self._ours(event.src_path)
+            if path is None:
+                return
+            if path.suffix == ".crdownload":
+                self.watcher._began(path)
+            elif path.suffix == ".pdf":
+                self.watcher._finalized(path)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Browser-free efast client.
+
+Calls the JSON search service that the 5500Search page uses behind the scenes
+and downloads the filing PDFs directly, over one pooled keep-alive
+requests.Session shared by all worker threads.
+
+The service paths below mirror the page's XHR calls. If efast changes them,
+only these constants and parse_search_results need to follow.
+"""
+
+import os
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BASE_URL = "https://www.efast.dol.gov"
+SEARCH_PATH = "/services/afs"
+DOWNLOAD_PATH = "/services/afs/download"
+PAGE_SIZE = 100
+# a query with more hits than this is too broad to page through; its result is flagged truncated
+MAX_PAGES = 10
+# efast's "try back later" answers; left to the caller's rate controller rather than retried here
+THROTTLE_STATUSES = (429, 503)
+
+
+def _first(value):
+    # search fields come back either as scalars or as one-element lists
+    if isinstance(value, list):
+        return value[0] if value else ""
+    return value if value is not None else ""
+
+
+def total_hits(payload: dict) -> int | None:
+    """The number of hits the query has over all pages, when the response says."""
+    hits = payload.get("hits", {})
+    found = hits.get("found") if isinstance(hits, dict) else None
+    return int(found) if found is not None else None
+
+
+def parse_search_results(payload: dict) -> list[dict]:
+    """Flatten a search response into rows of plan_name / plan_year / ack_id (+ ein / pn when present)."""
+    hits = payload.get("hits", {})
+    hits = hits.get("hit", []) if isinstance(hits, dict) else hits
+
+    rows = []
+    for hit in hits:
+        fields = hit.get("fields", hit)
+        rows.append({
+            "plan_name": str(_first(fields.get("planname"))),
+            "plan_year": str(_first(fields.get("planyear"))),
+            "ack_id": str(_first(fields.get("ackid")) or hit.get("id", "")),
+        })
+        for field, key in (("ein", "ein"), ("spons_dfe_ein", "ein"), ("pn", "pn"), ("spons_dfe_pn", "pn")):
+            if fields.get(field) is not None:
+                rows[-1][key] = str(_first(fields[field]))
+    return rows
+
+
+def is_throttled(error: requests.RequestException) -> bool:
+    """Whether a failed request was efast asking us to slow down (HTTP 429 / 503, also after retries)."""
+    if error.response is not None:
+        return error.response.status_code in THROTTLE_STATUSES
+    if isinstance(error, requests.exceptions.RetryError) and error.args:
+        # urllib3's MaxRetryError, whose reason reads "too many 503 error responses"
+        reason = str(getattr(error.args[0], "reason", ""))
+        return any(f"{status} error" in reason for status in THROTTLE_STATUSES)
+    return False
+
+
+class EfastHttpClient:
+    def __init__(self, base_url: str = BASE_URL, pool_size: int = 8, timeout: float = 20):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        # gateway hiccups are retried here; throttling comes back as an HTTPError for the rate controller
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 504), raise_on_status=False,
+                      respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def search(self, query: str, year: str | None = None) -> tuple[list[dict], bool]:
+        """
+        Every result row of a query, PAGE_SIZE at a time, and whether rows
+        were left over after MAX_PAGES pages (then a plan missing from the
+        rows may still be on efast).
+        """
+        rows = []
+        for page in range(MAX_PAGES):
+            params = {"q": query, "size": PAGE_SIZE, "start": page * PAGE_SIZE}
+            if year:
+                params["planYear"] = year
+            resp = self.session.get(self.base_url + SEARCH_PATH, params=params, timeout=self.timeout)
+            resp.raise_for_status()
+            payload = resp.json()
+            page_rows = parse_search_results(payload)
+            rows.extend(page_rows)
+            found = total_hits(payload)
+            # without a hit count, a full page means there may be another one
+            if len(page_rows) < PAGE_SIZE or (found is not None and len(rows) >= found):
+                return rows, False
+        return rows, True
+
+    def download(self, ack_id: str, target_path: Path) -> int:
+        """Stream one filing PDF to target_path; returns the number of bytes written."""
+        url = f"{self.base_url}{DOWNLOAD_PATH}/{ack_id}"
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_path.with_name(target_path.name + ".part")
+
+        size = 0
+        with self.session.get(url, stream=True, timeout=self.timeout) as resp:
+            resp.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for block in resp.iter_content(chunk_size=1 << 16):
+                    f.write(block)
+                    size += len(block)
+        os.replace(tmp_path, target_path)
+        return size
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed cache for extracted filing text.
+
+Entries are keyed by the SHA-256 of the PDF bytes. The text lives in
+objects/<sha[:2]>/<sha>.txt.gz; a small SQLite database next to it holds
+page count, character count, derived features and a last-used timestamp
+per entry, plus a (path, size, mtime) -> sha256 memo so unchanged files are
+not even re-hashed. The total size of the text objects is bounded by
+max_bytes with least-recently-used eviction.
+"""
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+
+class ExtractionCache:
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._conn = sqlite3.connect(self.cache_dir / "cache.sqlite")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                sha256     TEXT PRIMARY KEY,
+                pages      INTEGER NOT NULL,
+                chars      INTEGER NOT NULL,
+                bytes      INTEGER NOT NULL,
+                features   TEXT,
+                created_at REAL NOT NULL,
+                last_used  REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS files (
+                path     TEXT PRIMARY KEY,
+                size     INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256   TEXT NOT NULL
+            );
+            """
+        )
+
+    def object_path(self, sha256: str) -> Path:
+        return object_path(self.objects_dir, sha256)
+
+    # ---------- file -> hash memo ----------
+    def lookup_file(self, path: str, size: int, mtime_ns: int) -> str | None:
+        row = self._conn.execute(
+            "SELECT sha256 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?", (path, size, mtime_ns)
+        ).fetchone()
+        return row[0] if row else None
+
+    def remember_file(self, path: str, size: int, mtime_ns: int, sha256: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+            (path, size, mtime_ns, sha256),
+        )
+        self._conn.commit()
+
+    # ---------- entries ----------
+    def get(self, sha256: str) -> dict | None:
+        row = self._conn.execute(
+            "SELECT pages, chars, bytes, features FROM entries WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        if row is None or not self.object_path(sha256).exists():
+            return None
+        self._conn.execute("UPDATE entries SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+        self._conn.commit()
+        pages, chars, size, features = row
+        return {"sha256": sha256, "pages": pages, "chars": chars, "bytes": size,
+                "features": json.loads(features) if features else None}
+
+    def put(self, sha256: str, pages: int, chars: int):
+        now = time.time()
+        size = self.object_path(sha256).stat().st_size
+        self._conn.execute(
+            """
+            INSERT INTO entries (sha256, pages, chars, bytes, features, created_at, last_used)
+            VALUES (?, ?, ?, ?, NULL, ?, ?)
+            ON CONFLICT(sha256) DO UPDATE SET
+                pages = excluded.pages, chars = excluded.chars,
+                bytes = excluded.bytes, last_used = excluded.last_used
+            """,
+            (sha256, pages, chars, size, now, now),
+        )
+        self._conn.commit()
+
+    def set_features(self, sha256: str, features: dict):
+        self._conn.execute("UPDATE entries SET features = ? WHERE sha256 = ?", (json.dumps(features), sha256))
+        self._conn.commit()
+
+    def total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+
+    def evict(self, protect_since: float | None = None) -> int:
+        """Drop least-recently-used entries until under max_bytes; returns how many were dropped."""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        rows = self._conn.execute("SELECT sha256, bytes, last_used FROM entries ORDER BY last_used").fetchall()
+        for sha256, size, last_used in rows:
+            if total <= self.max_bytes:
+                break
+            if protect_since is not None and last_used >= protect_since:
+                # everything from here on was used by the current run
+                print("Warning: the text cache budget is smaller than the current corpus.")
+                break
+            self.object_path(sha256).unlink(missing_ok=True)
+            self._conn.execute("DELETE FROM entries WHERE sha256 = ?", (sha256,))
+            self._conn.execute("DELETE FROM files WHERE sha256 = ?", (sha256,))
+            total -= size
+            evicted += 1
+        self._conn.commit()
+        return evicted
+
+    def close(self):
+        self._conn.close()
+
+
+def object_path(objects_dir: Path, sha256: str) -> Path:
+    return Path(objects_dir) / sha256[:2] / f"{sha256}.txt.gz"
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+Full-text index over extracted filing text (SQLite FTS5).
+
+Documents come from text_store/index.csv (Step 3) and are keyed by content
+hash, so re-running the build only indexes text that is new or changed.
+Each document is tied back to every plan and year that filed it (the same
+PDF can be filed by several plans) through the filing store's manifest
+(carried in index.csv), or for an older flat outputs/ through the
+<slug>__<year>.pdf naming and filtered_401k_403b_plans.csv.
+
+The FTS table is contentless: the text itself already lives in the
+extraction cache, the index only stores postings. Queries use FTS5 syntax:
+
+    python filing_index.py build
+    python filing_index.py query '"safe harbor" AND "4%" AND match'
+    python filing_index.py query 'NEAR(automatic enrollment, 5) NOT QACA'
+"""
+
+import argparse
+import gzip
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from filing_store import registry_slugs
+from plan_registry import NO_KEY, plan_id, read_registry
+
+INDEX_DB = "filings_fts.sqlite"
+PLANS_CSV = "filtered_401k_403b_plans.csv"
+PDF_NAME = re.compile(r"^(?P<slug>.*)__(?P<year>\d{4})\.pdf$")
+
+
+class FilingIndex:
+    def __init__(self, db_path: Path):
+        self._conn = sqlite3.connect(db_path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id    INTEGER PRIMARY KEY,
+                sha256    TEXT UNIQUE NOT NULL,
+                pdf       TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(
+                body, content='', tokenize="porter unicode61 tokenchars '%'"
+            );
+            """
+        )
+        # the filings (plan id, year) of each document; indexes before this held one plan per document
+        tables = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_plans (
+                doc_id    INTEGER NOT NULL REFERENCES docs(doc_id),
+                plan_id   TEXT NOT NULL,
+                plan_name TEXT,
+                plan_key  INTEGER,
+                year      TEXT NOT NULL,
+                active    INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (doc_id, plan_id, year)
+            )
+            """
+        )
+        if "doc_plans" not in tables:
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(docs)")}
+            if "plan_name" in columns:
+                self._conn.execute(
+                    """
+                    INSERT OR IGNORE INTO doc_plans (doc_id, plan_id, plan_name, year, active)
+                    SELECT doc_id, COALESCE(plan_name, ''), plan_name, COALESCE(year, ''), active FROM docs
+                    """
+                )
+        self._conn.commit()
+
+    def update(self, store_dir: Path, plans_csv: str = PLANS_CSV) -> int:
+        """
+        Index new filings from store_dir/index.csv and retire ones no longer
+        present. Text is indexed once per content hash; every (plan, year)
+        filing it is a document of gets its own doc_plans row.
+        """
+        index_df = pd.read_csv(store_dir / "index.csv",
+                               dtype={"sha256": str, "plan_name": str, "plan_key": "Int64", "year": str})
+        index_df = index_df[index_df["status"].isin(["ok", "cached"])]
+
+        plan_by_slug = {}
+        if Path(plans_csv).exists():
+            plan_by_slug = registry_slugs(read_registry(plans_csv))
+
+        docs = dict(self._conn.execute("SELECT sha256, doc_id FROM docs"))
+        known = {(doc_id, plan, year): active for doc_id, plan, year, active in
+                 self._conn.execute("SELECT doc_id, plan_id, year, active FROM doc_plans")}
+        current = set()
+
+        added = 0
+        with self._conn:
+            for row in index_df.itertuples(index=False):
+                pdf, sha256, text_path = row.pdf, row.sha256, row.text_path
+                doc_id = docs.get(sha256)
+                if doc_id is None:
+                    with gzip.open(text_path, "rt", encoding="utf-8") as f:
+                        body = f.read()
+                    doc_id = self._conn.execute("INSERT INTO docs (sha256, pdf) VALUES (?, ?)",
+                                                (sha256, pdf)).lastrowid
+                    self._conn.execute("INSERT INTO fts (rowid, body) VALUES (?, ?)", (doc_id, body))
+                    docs[sha256] = doc_id
+
+                plan_name = getattr(row, "plan_name", None)
+                if isinstance(plan_name, str) and plan_name:
+                    plan_key = getattr(row, "plan_key", pd.NA)
+                    plan_key, year = (None if pd.isna(plan_key) else int(plan_key)), str(row.year)
+                else:
+                    m = PDF_NAME.match(pdf)
+                    slug, year = (m["slug"], m["year"]) if m else (Path(pdf).stem, "")
+                    plan_name, plan_key = plan_by_slug.get(slug, (slug, None))
+                filing = (doc_id, plan_id(plan_name, NO_KEY if plan_key is None else plan_key), year)
+                current.add(filing)
+                if filing in known:
+                    if not known[filing]:
+                        self._conn.execute("UPDATE doc_plans SET active = 1 WHERE doc_id = ? AND plan_id = ? "
+                                           "AND year = ?", filing)
+                    continue
+                self._conn.execute(
+                    "INSERT INTO doc_plans (doc_id, plan_id, plan_name, plan_key, year) VALUES (?, ?, ?, ?, ?)",
+                    (*filing[:2], plan_name, plan_key, year),
+                )
+                known[filing] = 1
+                added += 1
+
+            # filings that were replaced or removed stop matching; their postings stay until a rebuild
+            stale = [filing for filing, active in known.items() if active and filing not in current]
+            self._conn.executemany("UPDATE doc_plans SET active = 0 WHERE doc_id = ? AND plan_id = ? AND year = ?",
+                                   stale)
+        return added
+
+    def search(self, query: str, limit: int = 50) -> pd.DataFrame:
+        rows = self._conn.execute(
+            """
+            SELECT p.plan_name, p.plan_key, p.year, d.pdf, bm25(fts) AS score
+            FROM fts JOIN docs d ON d.doc_id = fts.rowid JOIN doc_plans p ON p.doc_id = d.doc_id
+            WHERE fts MATCH ? AND p.active = 1
+            ORDER BY score
+            LIMIT ?
+            """,
+            (query, limit),
+        ).fetchall()
+        return pd.DataFrame(rows, columns=["plan_name", "plan_key", "year", "pdf", "score"])
+
+    def close(self):
+        self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text index over extracted Form 5500 filings")
+    parser.add_argument("--store-dir", default="text_store")
+    parser.add_argument("--db", default=None, help=f"index database (default: <store-dir>/{INDEX_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="index new or changed filings")
+    query_parser = sub.add_parser("query", help="run an FTS5 query (phrases, AND/OR/NOT, NEAR)")
+    query_parser.add_argument("query")
+    query_parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    store_dir = Path(args.store_dir)
+    index = FilingIndex(Path(args.db) if args.db else store_dir / INDEX_DB)
+    try:
+        if args.command == "build":
+            added = index.update(store_dir)
+            print(f"Indexed {added} new filings.")
+        else:
+            t0 = time.perf_counter()
+            try:
+                hits = index.search(args.query, args.limit)
+            except sqlite3.OperationalError as e:
+                print(f"Invalid query: {e}")
+                return
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            print(hits.to_string(index=False) if len(hits) else "No matches.")
+            print(f"\n{len(hits)} matches in {elapsed_ms:.1f} ms")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed storage for downloaded filings.
+
+PDFs are stored once per distinct content, as objects/<sha[:2]>/<sha>.pdf
+under the store root (outputs/ by default), the same sharding as the text
+cache. A SQLite manifest maps (plan, year) -> sha256, so checking or
+finding a plan's filing is one indexed lookup instead of a directory scan.
+Plans are identified by their plan key (EIN * 1000 + PN) when they have one
+and by name otherwise (plan_registry.plan_id), so two sponsors' plans that
+share a name, or whose names truncate to the same file name, no longer
+overwrite each other.
+
+Byte-identical downloads (amended filings re-served, two plans pointing at
+the same document) share one object; replacing a plan's filing drops the
+old object once nothing references it.
+
+    python filing_store.py stats
+    python filing_store.py import     # move a flat outputs/<slug>__<year>.pdf layout in
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from plan_registry import NO_KEY, plan_id
+
+STORE_DIR = Path("outputs")
+MANIFEST = "manifest.sqlite"
+
+
+def sha256_file(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FilingStore:
+    def __init__(self, root: Path = STORE_DIR):
+        self.root = Path(root).resolve()
+        self.objects_dir = self.root / "objects"
+        self.staging_dir = self.root / ".staging"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # shared by the Step 2 worker threads, serialized through the lock
+        self._conn = sqlite3.connect(self.root / MANIFEST, check_same_thread=False)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(filings)")}
+        if columns and "plan_id" not in columns:
+            self._migrate_name_keyed()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS filings (
+                plan_id   TEXT NOT NULL,
+                year      TEXT NOT NULL,
+                plan_name TEXT NOT NULL,
+                plan_key  INTEGER,
+                sha256    TEXT NOT NULL,
+                bytes     INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (plan_id, year)
+            );
+            CREATE INDEX IF NOT EXISTS filings_sha256 ON filings (sha256);
+            """
+        )
+
+    def _migrate_name_keyed(self):
+        # manifests written when filings were keyed by plan name; the id format is plan_registry.plan_id's
+        with self._conn:
+            self._conn.executescript(
+                """
+                ALTER TABLE filings RENAME TO filings_by_name;
+                DROP INDEX IF EXISTS filings_sha256;
+                DROP INDEX IF EXISTS filings_plan_key;
+                CREATE TABLE filings (
+                    plan_id   TEXT NOT NULL,
+                    year      TEXT NOT NULL,
+                    plan_name TEXT NOT NULL,
+                    plan_key  INTEGER,
+                    sha256    TEXT NOT NULL,
+                    bytes     INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    PRIMARY KEY (plan_id, year)
+                );
+                INSERT OR REPLACE INTO filings
+                SELECT CASE WHEN plan_key IS NULL THEN plan_name
+                            ELSE printf('%09d-%03d', plan_key / 1000, plan_key % 1000) END,
+                       year, plan_name, plan_key, sha256, bytes, stored_at
+                FROM filings_by_name;
+                DROP TABLE filings_by_name;
+                """
+            )
+
+    @staticmethod
+    def exists(root: Path = STORE_DIR) -> bool:
+        return (Path(root) / MANIFEST).exists()
+
+    def object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / f"{sha256}.pdf"
+
+    def staging_path(self) -> Path:
+        """A fresh path on the store's filesystem to download into before put()."""
+        return self.staging_dir / f"{uuid.uuid4().hex}.pdf"
+
+    # ---------- lookups ----------
+    def path(self, plan_name: str, year: str, plan_key: int | None = None) -> Path | None:
+        """The stored filing of the plan with this key (or, without a key, this name) for year."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM filings WHERE plan_id = ? AND year = ?", (plan_id(plan_name, plan_key), str(year))
+            ).fetchone()
+        if row is None:
+            return None
+        path = self.object_path(row[0])
+        return path if path.exists() else None
+
+    def entries(self):
+        """(plan_name, plan_key, year, object path) for every stored filing; plan_key is None when unknown."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT plan_name, plan_key, year, sha256 FROM filings ORDER BY plan_name, plan_key, year"
+            ).fetchall()
+        for plan_name, plan_key, year, sha256 in rows:
+            yield plan_name, plan_key, year, self.object_path(sha256)
+
+    # ---------- writes ----------
+    def put(self, plan_name: str, year: str, src: Path, plan_key: int | None = None) -> Path:
+        """
+        Move a downloaded file into the store (or drop it if its content is
+        stored already), as the plan's filing for year; the plan is
+        identified by plan_key when given, by plan_name otherwise.
+        """
+        pid = plan_id(plan_name, plan_key)
+        sha256 = sha256_file(src)
+        size = src.stat().st_size
+        dest = self.object_path(sha256)
+        with self._lock:
+            if dest.exists():
+                src.unlink()
+            else:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(src, dest)
+            old = self._conn.execute(
+                "SELECT sha256 FROM filings WHERE plan_id = ? AND year = ?", (pid, str(year))
+            ).fetchone()
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO filings (plan_id, year, plan_name, plan_key, sha256, bytes, stored_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (pid, str(year), plan_name, plan_key, sha256, size, time.time()),
+            )
+            if old and old[0] != sha256:
+                self._drop_if_unreferenced(old[0])
+            self._conn.commit()
+        return dest
+
+    def _drop_if_unreferenced(self, sha256: str):
+        if self._conn.execute("SELECT 1 FROM filings WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone() is None:
+            self.object_path(sha256).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            filings, logical = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM filings").fetchone()
+            objects, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM (SELECT sha256, MAX(bytes) AS bytes "
+                "FROM filings GROUP BY sha256)"
+            ).fetchone()
+        return {"filings": filings, "objects": objects, "stored_mb": round(stored / 1024 ** 2, 1),
+                "deduplicated_mb": round((logical - stored) / 1024 ** 2, 1)}
+
+    def import_flat(self, pdf_dir: Path, plan_by_slug: dict[str, tuple[str, int | None]] | None = None) -> int:
+        """
+        Move <slug>__<year>.pdf files from a flat directory into the store.
+        Slugs are mapped back to (full plan name, plan key) through
+        plan_by_slug (see registry_slugs) when given; the slug itself is
+        used as an unkeyed name otherwise.
+        """
+        from filing_index import PDF_NAME
+
+        by_slug = plan_by_slug or {}
+        moved = 0
+        for pdf in sorted(Path(pdf_dir).glob("*.pdf")):
+            m = PDF_NAME.match(pdf.name)
+            if not m:
+                continue
+            plan_name, plan_key = by_slug.get(m["slug"], (m["slug"], None))
+            self.put(plan_name, m["year"], pdf, plan_key)
+            moved += 1
+        return moved
+
+    def close(self):
+        self._conn.close()
+
+
+def registry_slugs(plans) -> dict[str, tuple[str, int | None]]:
+    """
+    File_Slug -> (Full_Plan_Name, plan key) over a plan registry frame. A flat
+    directory held one file per slug, so the first plan with a slug wins, as
+    it did when the files were written.
+    """
+    by_slug = {}
+    for slug, name, key in zip(plans["File_Slug"], plans["Full_Plan_Name"], plans["Plan_Key"].tolist()):
+        by_slug.setdefault(slug, (name, None if key == NO_KEY else key))
+    return by_slug
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed store of downloaded filings")
+    parser.add_argument("--root", default=str(STORE_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="filings, distinct objects and space saved by deduplication")
+    import_parser = sub.add_parser("import", help="move a flat <slug>__<year>.pdf directory into the store")
+    import_parser.add_argument("--from", dest="pdf_dir", default=None, help="flat directory (default: the store root)")
+    import_parser.add_argument("--plans", default="filtered_401k_403b_plans.csv",
+                               help="Step 1 output, to map file names back to full plan names")
+    args = parser.parse_args()
+
+    store = FilingStore(Path(args.root))
+    try:
+        if args.command == "import":
+            plan_by_slug = None
+            if Path(args.plans).exists():
+                from plan_registry import read_registry
+                plan_by_slug = registry_slugs(read_registry(args.plans))
+            moved = store.import_flat(Path(args.pdf_dir or args.root), plan_by_slug)
+            print(f"Moved {moved} PDFs into {store.objects_dir}.")
+        print(store.stats())
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
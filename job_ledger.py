@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent per-plan job ledger for Step 2.
+
+Every processed plan is recorded in a small SQLite file with its status,
+attempt count, timestamps, output path, the search query it went out under,
+its sponsor (plan_names.sponsor_key) and the filing years it was searched
+for, so a restarted crawl can skip finished plans and retry only the failed
+ones, a run for more years picks finished plans up again, and the scheduler
+can learn which sponsors tend to have a filing. Plans are keyed by plan id (plan_registry.plan_id), so two
+sponsors' plans with the same name are tracked apart.
+"""
+
+import sqlite3
+import threading
+import time
+
+from plan_registry import NO_KEY, plan_id
+
+DONE_STATUSES = ("found", "not_found")
+# truncated: the plan was not among the result rows read, but more rows were left unread
+FAILED_STATUSES = ("error", "download_failed", "truncated")
+# the search itself came back (an error did not reach efast, or was throttled): these use up an attempt
+ANSWERED_STATUSES = DONE_STATUSES + ("download_failed", "truncated")
+# every run before the years were recorded searched this year only
+LEGACY_YEARS = "2024"
+
+
+class JobLedger:
+    def __init__(self, db_path: str = "step2_ledger.sqlite"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # shared by the worker threads, serialized through the lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                plan_id     TEXT PRIMARY KEY,
+                plan_name   TEXT,
+                status      TEXT NOT NULL,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                first_at    REAL,
+                last_at     REAL,
+                output_path TEXT,
+                query       TEXT,
+                years       TEXT,
+                sponsor     TEXT
+            )
+            """
+        )
+        # ledgers written before queries / years / plan ids / sponsors were recorded
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "plan_id" not in columns:
+            # name-keyed rows keep the name as their id, which is right for plans without a key
+            self._conn.execute("ALTER TABLE jobs RENAME COLUMN plan_name TO plan_id")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN plan_name TEXT")
+            self._conn.execute("UPDATE jobs SET plan_name = plan_id")
+        if "query" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN query TEXT")
+        if "years" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN years TEXT")
+            self._conn.execute("UPDATE jobs SET years = ?", (LEGACY_YEARS,))
+        if "sponsor" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN sponsor TEXT")
+        self._conn.commit()
+
+    def pending(self, plan_ids: list[str], max_attempts: int = 3, only_failed: bool = False,
+                retry_not_found: bool = False, years: list[str] | None = None) -> list[str]:
+        """
+        Filter plan_ids down to the ones that still need work: never seen
+        (unless only_failed), failed with attempts left, or (unless
+        only_failed) searched before for only some of years.
+        """
+        with self._lock:
+            known = {
+                plan: (status, attempts, set((searched or "").split(";")))
+                for plan, status, attempts, searched in
+                self._conn.execute("SELECT plan_id, status, attempts, years FROM jobs")
+            }
+
+        retry_statuses = FAILED_STATUSES + (("not_found",) if retry_not_found else ())
+        todo = []
+        for plan in plan_ids:
+            if plan not in known:
+                if not only_failed:
+                    todo.append(plan)
+                continue
+            status, attempts, searched = known[plan]
+            if status in retry_statuses and attempts < max_attempts:
+                todo.append(plan)
+            elif years and not only_failed and not searched.issuperset(years):
+                todo.append(plan)
+        return todo
+
+    def record(self, result: dict, years: list[str] | None = None):
+        """
+        Record one plan's outcome. Outcomes that answered the search count
+        as an attempt, and (unless truncated) add years to the years the
+        plan has been searched for; an error only updates the status.
+        """
+        now = time.time()
+        plan = plan_id(result["Full_Plan_Name"], result.get("Plan_Key", NO_KEY))
+        answered = result["Status"] in ANSWERED_STATUSES
+        with self._lock:
+            row = self._conn.execute("SELECT years FROM jobs WHERE plan_id = ?", (plan,)).fetchone()
+            searched = set(filter(None, (row[0] or "").split(";") if row else ()))
+            if answered and result["Status"] != "truncated":
+                searched |= set(years or ())
+            self._conn.execute(
+                """
+                INSERT INTO jobs (plan_id, plan_name, status, attempts, first_at, last_at, output_path, query, years,
+                                  sponsor)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(plan_id) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = jobs.attempts + excluded.attempts,
+                    last_at = excluded.last_at,
+                    output_path = excluded.output_path,
+                    query = excluded.query,
+                    years = excluded.years,
+                    sponsor = COALESCE(excluded.sponsor, jobs.sponsor)
+                """,
+                (plan, result["Full_Plan_Name"], result["Status"], int(answered), now, now,
+                 result.get("Saved_Path", ""), result.get("Query"), ";".join(sorted(searched)) or None,
+                 result.get("Sponsor_Key")),
+            )
+            self._conn.commit()
+
+    def sponsor_history(self) -> dict[str, tuple[int, int]]:
+        """
+        sponsor -> (found, searched) over plans with a final answer (found /
+        not_found); rows from before sponsors were recorded count under their query.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT COALESCE(sponsor, query) AS history_key, SUM(status = 'found'), COUNT(*) FROM jobs
+                WHERE history_key IS NOT NULL AND status IN ({", ".join("?" * len(DONE_STATUSES))})
+                GROUP BY history_key
+                """,
+                DONE_STATUSES,
+            ).fetchall()
+        return {sponsor: (found, searched) for sponsor, found, searched in rows}
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def close(self):
+        self._conn.close()
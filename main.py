@@ -3,87 +3,356 @@
 # -*- coding: utf-8 -*-
 
 """
-Simple main orchestrator.
+Main orchestrator.
 
 Run with:
-    python main.py
+    python main.py                    # run the stages whose inputs changed
+    python main.py --force step2      # rerun a stage (and everything after it)
+    python main.py --backend http --workers 4 --limit 0
+    python main.py --backend http --limit 0 --budget-minutes 30
+    python main.py --backend http --limit 0 --years 2019-2024
+    python main.py --trace --metrics --profile step2 --profiler sample
 
-Pipeline:
-1. Step 1: Get_data.py
-   - Read form5500.csv
+Pipeline (a declared stage graph, see STAGES):
+1. step1: Get_data.py
+   - Read f_5500_2024_all.csv
    - Filter 401(k) / 403(b)
-   - Deduplicate
-   - Output: filtered_401k_403b_plans.csv
+   - Deduplicate on sponsor EIN + plan number
+   - Output: filtered_401k_403b_plans.csv (the plan registry, see plan_registry.py)
+   - With --multi-year: every f_5500_<year>_all.csv in a process pool
+     -> filtered_401k_403b_plans_by_year.csv
 
-2. Step 2: Selenium search + download
-   - Read filtered_401k_403b_plans.csv
+2. step2: Searching and Downloading.py, in-process
    - Search each plan on efast
-   - Download 2024 PDFs
+   - Download the PDFs of the requested years (2024 by default; --years
+     searches each plan once for all of them) into the outputs/ filing
+     store (filing_store.py)
+   - When step1 runs too, plans are handed over chunk by chunk while
+     Step 1 is still reading, so downloads start right away
+
+3. step3: Extract_text.py
+   - Read the PDFs in the outputs/ filing store (filing_store.py) in a
+     process pool, page by page
+   - Output: text_store/objects/ + text_store/index.csv
+   - plan_features.py: match / vesting / auto-enroll features
+     -> text_store/plan_features.csv
+
+A stage is skipped when the SHA-256 of each of its inputs (data files and
+its own scripts) and the options that change its output match the last
+successful run recorded in .pipeline_state.json and its outputs still
+exist. A stage that runs makes every stage after it run too. Step 2 only
+counts as successful once it has worked through every plan: a run cut short
+by --limit or a budget, or with plans left to retry, runs again next time.
+
+--metrics exports stage run counts and durations, plus Step 2's per-phase
+histograms and outcome counters, to pipeline_metrics.prom; --trace writes
+one JSON line per plan to step2_trace.jsonl; --profile wraps the given
+stages in cProfile or a sampling profiler (see telemetry.py).
 """
 
+import argparse
+import hashlib
 import importlib.util
-import subprocess
+import json
+import os
 import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from plan_registry import read_registry
+from telemetry import METRICS_FILE, PROFILERS, TRACE_FILE, Metrics, Step2Telemetry, TraceLog, profiled
+
+STATE_FILE = Path(".pipeline_state.json")
+FORM5500_CSV = Path("f_5500_2024_all.csv")
+PLANS_CSV = Path("filtered_401k_403b_plans.csv")
+
+# name -> inputs (paths or globs), outputs; listed in dependency order
+STAGES = {
+    "step1": {
+        "inputs": [str(FORM5500_CSV), "Get_data.py", "plan_registry.py", "plan_names.py"],
+        "outputs": [str(PLANS_CSV)],
+    },
+    "step2": {
+        "inputs": [str(PLANS_CSV), "Searching and Downloading.py", "plan_matching.py", "efast_http.py",
+                   "crawl_scheduler.py", "filing_store.py", "job_ledger.py", "browser_sessions.py",
+                   "download_watcher.py", "rate_control.py", "phase_stats.py", "plan_registry.py",
+                   "plan_names.py"],
+        # options that change which filings the stage fetches
+        "params": ["base_url", "limit", "years", "search_by", "budget_searches", "budget_minutes"],
+        "outputs": ["step2_results.csv"],
+    },
+    "step3": {
+        "inputs": ["outputs/manifest.sqlite", "outputs/*.pdf", "Extract_text.py", "plan_features.py"],
+        "outputs": ["text_store/index.csv", "text_store/plan_features.csv"],
+    },
+}
+
 
 # ---------- helper ----------
 def load_module(py_path: Path, name: str):
     spec = importlib.util.spec_from_file_location(name, str(py_path))
     mod = importlib.util.module_from_spec(spec)
+    # registered so process pools can pickle the module's functions
+    sys.modules[name] = mod
     spec.loader.exec_module(mod)  # type: ignore
     return mod
 
 
+def load_state() -> dict:
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text())
+    return {"files": {}, "stages": {}}
+
+
+def save_state(state: dict):
+    tmp_path = STATE_FILE.with_name(STATE_FILE.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, indent=1))
+    os.replace(tmp_path, STATE_FILE)
+
+
+def file_digest(path: Path, state: dict) -> str:
+    # files whose size and mtime are unchanged are not re-hashed
+    st = path.stat()
+    known = state["files"].get(str(path))
+    if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+        return known[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    state["files"][str(path)] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+    return h.hexdigest()
+
+
+def input_digests(stage: str, state: dict, options: dict | None = None) -> dict:
+    digests = {}
+    for pattern in STAGES[stage]["inputs"]:
+        paths = sorted(Path().glob(pattern)) if any(c in pattern for c in "*?[") else [Path(pattern)]
+        for path in paths:
+            digests[str(path)] = file_digest(path, state) if path.exists() else None
+    params = {name: (options or {}).get(name) for name in STAGES[stage].get("params", [])}
+    if params:
+        digests["params"] = json.dumps(params, sort_keys=True)
+    return digests
+
+
+def is_up_to_date(stage: str, state: dict, options: dict | None = None) -> bool:
+    last = state["stages"].get(stage)
+    if last is None or not all(Path(p).exists() for p in STAGES[stage]["outputs"]):
+        return False
+    return last == input_digests(stage, state, options)
+
+
+def mark_done(stage: str, state: dict, options: dict | None = None):
+    state["stages"][stage] = input_digests(stage, state, options)
+    save_state(state)
+
+
 # ---------- STEP 1 ----------
+def load_step1():
+    step1_script = Path("Get_data.py")
+    if not step1_script.exists():
+        raise FileNotFoundError("Get_data.py not found")
+    if not FORM5500_CSV.exists():
+        raise FileNotFoundError(f"{FORM5500_CSV} not found in project directory")
+    return load_module(step1_script, "Get_data")
+
+
 def run_step1():
     print("\n===== STEP 1: Extract & clean plan names =====")
 
+    mod = load_step1()
+    mod.process_form5500(str(FORM5500_CSV), chunksize=mod.CHUNKSIZE, use_cache=True)
 
-    form5500_csv = Path("f_5500_2024_all.csv")
+    if not PLANS_CSV.exists():
+        raise RuntimeError("STEP 1 failed: output CSV not generated")
 
-    if not form5500_csv.exists():
-        raise FileNotFoundError("form5500.csv not found in project directory")
+    print("STEP 1 completed.")
 
-    step1_script = Path("Get_data.py")
+
+def stream_step1():
+    """Step 1 as a generator of plan registry batches, for feeding Step 2 directly."""
+    print("\n===== STEP 1: Extract & clean plan names (streaming into Step 2) =====")
+
+    mod = load_step1()
+    yield from mod.stream_form5500(str(FORM5500_CSV), chunksize=mod.CHUNKSIZE,
+                                   output_file=str(PLANS_CSV), use_cache=True)
 
 
+def run_step1_multi_year():
+    print("\n===== STEP 1: Extract & clean plan names (multi-year) =====")
+
+    step1_script = Path("Get_data.py")
     if not step1_script.exists():
         raise FileNotFoundError("Get_data.py not found")
 
-    mod = load_module(step1_script, "get_data")
+    mod = load_module(step1_script, "Get_data")
+
+    files_by_year = mod.find_yearly_files(".")
+    if not files_by_year:
+        raise FileNotFoundError("No f_5500_<year>_all.csv files found in project directory")
 
-    mod.process_form5500(str(form5500_csv)) 
-    
-    out_csv = Path("filtered_401k_403b_plans.csv")
+    mod.process_form5500_years(files_by_year, use_cache=True)
+
+    out_csv = Path("filtered_401k_403b_plans_by_year.csv")
     if not out_csv.exists():
-        raise RuntimeError("STEP 1 failed: output CSV not generated")
+        raise RuntimeError("STEP 1 failed: multi-year output CSV not generated")
 
-    print("STEP 1 completed.")
+    print("STEP 1 (multi-year) completed.")
 
 
 # ---------- STEP 2 ----------
-def run_step2():
+def run_step2(plan_batches=None, **options) -> bool:
+    """
+    Run Step 2 in this process. plan_batches defaults to the Step 1 CSV;
+    returns True when every plan is done: no limit or budget stopped the
+    crawl and the ledger has no plan left to retry.
+    """
     print("\n===== STEP 2: Search & download on efast =====")
 
-    base_dir = Path(__file__).resolve().parent
-    step2_script = base_dir / "Searching and Downloading.py"
+    step2_script = Path(__file__).resolve().parent / "Searching and Downloading.py"
     if not step2_script.exists():
         raise FileNotFoundError(f"Step 2 script not found: {step2_script}")
+    mod = load_module(step2_script, "searching_and_downloading")
+
+    if plan_batches is None:
+        if not PLANS_CSV.exists():
+            raise FileNotFoundError(f"{PLANS_CSV} not found; run Step 1 first")
+        plan_batches = [read_registry(PLANS_CSV)]
+
+    if isinstance(options.get("years"), str):
+        options["years"] = mod.parse_years(options["years"])
+    results_df = mod.download_plans(plan_batches, **options)
+    print("STEP 2 completed.")
+    return results_df.attrs["complete"]
+
 
-    subprocess.run([sys.executable, str(step2_script)], cwd=str(base_dir), check=True)
-    print("STEP 2 finished (check browser / downloads).")
+# ---------- STEP 3 ----------
+def run_step3():
+    print("\n===== STEP 3: Extract text from downloaded PDFs =====")
 
+    step3_script = Path("Extract_text.py")
+    if not step3_script.exists():
+        raise FileNotFoundError("Extract_text.py not found")
+
+    mod = load_module(step3_script, "Extract_text")
+
+    mod.extract_all()
+
+    features = load_module(Path("plan_features.py"), "plan_features")
+    features.build_feature_table()
+    print("STEP 3 completed.")
 
 
 # ---------- MAIN ----------
+@contextmanager
+def stage_run(name: str, metrics: Metrics, profile=(), profiler: str | None = None):
+    """Time (and optionally profile) one stage run into the pipeline metrics."""
+    t0 = time.perf_counter()
+    with profiled(name, profiler if any(s in profile for s in name.split("+")) else None):
+        yield
+    metrics.set("pipeline_stage_seconds", time.perf_counter() - t0, "Duration of the stage's last run", stage=name)
+    metrics.inc("pipeline_stage_runs_total", 1, "Stage runs and skips", stage=name, outcome="ran")
+    metrics.flush()
+
+
+def run_pipeline(force=(), stream: bool = True, step2_options: dict | None = None,
+                 metrics: Metrics | None = None, profile=(), profiler: str | None = None):
+    metrics = metrics or Metrics(None)
+    step2_options = step2_options or {}
+    options = {"step2": step2_options}
+    state = load_state()
+    stale = set()
+    for stage in STAGES:
+        # anything downstream of a stage that runs has to run as well
+        if stage in force or stale or not is_up_to_date(stage, state, options.get(stage)):
+            stale.add(stage)
+        else:
+            print(f"\n===== {stage}: inputs unchanged, skipped =====")
+            metrics.inc("pipeline_stage_runs_total", 1, "Stage runs and skips", stage=stage, outcome="skipped")
+
+    if "step1" in stale and "step2" in stale and stream:
+        with stage_run("step1+step2", metrics, profile, profiler):
+            batches = stream_step1()
+            step2_ok = run_step2(batches, **step2_options)
+            # Step 2 may stop early (--limit, a budget); Step 1 still has to finish its CSV
+            for _ in batches:
+                pass
+        mark_done("step1", state)
+    else:
+        if "step1" in stale:
+            with stage_run("step1", metrics, profile, profiler):
+                run_step1()
+            mark_done("step1", state)
+        step2_ok = True
+        if "step2" in stale:
+            with stage_run("step2", metrics, profile, profiler):
+                step2_ok = run_step2(**step2_options)
+
+    if "step2" in stale:
+        if step2_ok:
+            mark_done("step2", state, step2_options)
+        else:
+            print("Step 2 stopped before every plan was done (a limit, a budget or plans left to retry); "
+                  "it will run again next time.")
+
+    if "step3" in stale:
+        with stage_run("step3", metrics, profile, profiler):
+            run_step3()
+        mark_done("step3", state)
+    metrics.flush()
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Form 5500 401(k)/403(b) pipeline")
+    parser.add_argument("--multi-year", action="store_true",
+                        help="ingest every f_5500_<year>_all.csv in parallel (Step 1 only)")
+    parser.add_argument("--force", nargs="+", choices=list(STAGES), default=[],
+                        help="run these stages even if their inputs are unchanged")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="let Step 1 finish before Step 2 starts")
+    parser.add_argument("--workers", type=int, default=1, help="Step 2 workers")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium", help="Step 2 backend")
+    parser.add_argument("--base-url", default=None, help="efast base URL for the http backend")
+    parser.add_argument("--limit", type=int, default=None, help="Step 2 plan limit (0 = all)")
+    parser.add_argument("--search-by", choices=["key", "name"], default="name",
+                        help="Step 2 search: by plan name, or by sponsor EIN with a name search for misses")
+    parser.add_argument("--order", choices=["priority", "file"], default="priority",
+                        help="Step 2 order: big, likely-to-be-found plans first, or the CSV's order")
+    parser.add_argument("--budget-searches", type=int, default=0, help="Step 2 search budget (0 = no limit)")
+    parser.add_argument("--budget-minutes", type=float, default=0, help="Step 2 time budget (0 = no limit)")
+    parser.add_argument("--years", default=None,
+                        help="Step 2 filing years, e.g. 2019-2024 or 2021,2023 (default 2024)")
+    parser.add_argument("--trace", nargs="?", const=TRACE_FILE, default=None,
+                        help=f"append one JSON line per Step 2 plan to this file (default {TRACE_FILE})")
+    parser.add_argument("--metrics", nargs="?", const=METRICS_FILE, default=None,
+                        help=f"export Prometheus text metrics to this file (default {METRICS_FILE})")
+    parser.add_argument("--profile", nargs="+", choices=list(STAGES), default=[],
+                        help="profile these stages (output in profiles/)")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile",
+                        help="cprofile: exact, main thread only; sample: wall clock, all threads")
+    args = parser.parse_args()
+
     print("\n========== PIPELINE START ==========")
-    run_step1()
-    run_step2()
+    if args.multi_year:
+        run_step1_multi_year()
+    else:
+        step2_options = {"workers": args.workers, "backend": args.backend, "order": args.order,
+                         "search_by": args.search_by, "budget_searches": args.budget_searches, "budget_minutes": args.budget_minutes}
+        if args.base_url:
+            step2_options["base_url"] = args.base_url
+        if args.limit is not None:
+            step2_options["limit"] = args.limit
+        if args.years:
+            step2_options["years"] = args.years
+        metrics = Metrics(args.metrics)
+        if args.trace or args.metrics:
+            step2_options["telemetry"] = Step2Telemetry(TraceLog(args.trace) if args.trace else None, metrics)
+        run_pipeline(args.force, stream=not args.no_stream, step2_options=step2_options,
+                     metrics=metrics, profile=args.profile, profiler=args.profiler)
     print("\n========== PIPELINE END ==========")
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local stand-in for efast, for running Step 2 offline.
+
+Serves, from an in-memory list of filings:
+- the JSON search service and PDF downloads that efast_http talks to
+- a 5500Search page with the DOM the Selenium scraper drives: #search-field,
+  the "Go!" button, Show Filters / Plan Years / #planYearList, breadcrumb
+  delete buttons, result rows with an svg download icon, a next-page button
+  when there are more than PAGE_SIZE hits, and the "Please try back later"
+  modal
+
+Faults can be injected to load-test the scraper: a mean latency on every
+request, a share of searches (and page loads) answered with the throttling
+modal / HTTP 429 (or 503), and a share of downloads that fail with HTTP 500.
+
+Run with:
+    python mock_efast.py --port 8055
+    python mock_efast.py --latency 0.5 --throttle-rate 0.05 --download-error-rate 0.02
+then point the scraper at it:
+    python "Searching and Downloading.py" --url http://127.0.0.1:8055/5500Search/
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from efast_http import DOWNLOAD_PATH, PAGE_SIZE, SEARCH_PATH
+from plan_registry import read_registry
+
+PAGE_PATH = "/5500Search/"
+
+SEARCH_PAGE = """<!doctype html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>EFAST2 Filing Search (mock)</title>
+<style>
+  .hidden { display: none; }
+  .usa-modal { position: fixed; top: 30%; left: 30%; padding: 1em; background: #fff; border: 1px solid #000; }
+  td svg { cursor: pointer; }
+</style>
+</head>
+<body>
+<div id="breadcrumbs"></div>
+<input id="search-field" type="text" autocomplete="off">
+<button id="go-btn" type="button"><span>Go!</span></button>
+<button id="show-filters" type="button"><span>Show Filters</span></button>
+<div id="filters" class="hidden">
+  <button id="plan-years-btn" type="button" class="filter-category-button">Plan Years</button>
+  <div id="planYearList" class="hidden"></div>
+</div>
+<table>
+  <thead><tr><th></th><th>Plan Name</th><th>Plan Year</th></tr></thead>
+  <tbody id="results"></tbody>
+</table>
+<button id="next-page" type="button" class="usa-pagination__next-page hidden">Next</button>
+<div id="modal-root"></div>
+<script>
+const YEARS = __YEARS__;
+const THROTTLED = __THROTTLED__;
+const SEARCH_PATH = "__SEARCH_PATH__";
+const DOWNLOAD_PATH = "__DOWNLOAD_PATH__";
+const ICON = '<svg width="16" height="16" viewBox="0 0 16 16"><path d="M8 1v10M4 7l4 4 4-4M2 14h12" stroke="#000" fill="none"/></svg>';
+const state = {year: null, query: null, seq: 0, start: 0};
+
+function $(id) { return document.getElementById(id); }
+
+function clearResults() { $("results").innerHTML = ""; $("next-page").classList.add("hidden"); }
+
+function renderBreadcrumbs() {
+  const crumbs = [];
+  if (state.year) crumbs.push(["Plan Year: " + state.year, () => { state.year = null; }]);
+  if (state.query) crumbs.push(["Search: " + state.query, () => { state.query = null; state.seq++; clearResults(); }]);
+  $("breadcrumbs").innerHTML = "";
+  for (const [label, remove] of crumbs) {
+    const crumb = document.createElement("span");
+    crumb.textContent = label + " ";
+    const btn = document.createElement("button");
+    btn.type = "button";
+    btn.className = "breadcrumb-delete-btn";
+    btn.textContent = "\\u00d7";
+    btn.addEventListener("click", () => { remove(); renderBreadcrumbs(); });
+    crumb.appendChild(btn);
+    $("breadcrumbs").appendChild(crumb);
+  }
+}
+
+function showModal() {
+  $("modal-root").innerHTML = '<div class="usa-modal" role="dialog"><span>Please try back later</span> '
+    + '<button type="button" class="usa-modal__close"><span>Close</span></button></div>';
+  document.querySelector(".usa-modal__close").addEventListener("click", () => { $("modal-root").innerHTML = ""; });
+}
+
+function download(ackId) {
+  const a = document.createElement("a");
+  a.href = DOWNLOAD_PATH + "/" + encodeURIComponent(ackId);
+  a.download = ackId + ".pdf";
+  document.body.appendChild(a);
+  a.click();
+  a.remove();
+}
+
+function renderRows(hits) {
+  for (const hit of hits) {
+    const tr = document.createElement("tr");
+    const icon = document.createElement("td");
+    icon.innerHTML = ICON;
+    icon.addEventListener("click", () => download(hit.id));
+    const name = document.createElement("td");
+    name.textContent = hit.fields.planname;
+    const year = document.createElement("td");
+    year.textContent = hit.fields.planyear;
+    const ein = document.createElement("td");
+    ein.textContent = hit.fields.ein || "";
+    const pn = document.createElement("td");
+    pn.textContent = hit.fields.pn || "";
+    tr.append(icon, name, year, ein, pn);
+    $("results").appendChild(tr);
+  }
+}
+
+function search(start = 0) {
+  const q = start ? state.query : $("search-field").value.trim();
+  if (!q) return;
+  state.query = q;
+  const seq = ++state.seq;
+  clearResults();
+  renderBreadcrumbs();
+  const params = new URLSearchParams({q: q, start: start});
+  if (state.year) params.set("planYear", state.year);
+  fetch(SEARCH_PATH + "?" + params).then(resp => {
+    if (resp.status === 429 || resp.status === 503) { showModal(); return null; }
+    return resp.json();
+  }).then(data => {
+    if (!data || seq !== state.seq) return;
+    renderRows(data.hits.hit);
+    state.start = start;
+    if (start + data.hits.hit.length < data.hits.found) $("next-page").classList.remove("hidden");
+  });
+}
+
+$("go-btn").addEventListener("click", () => search());
+$("search-field").addEventListener("keydown", e => { if (e.key === "Enter") search(); });
+$("next-page").addEventListener("click", () => search(state.start + __PAGE_SIZE__));
+$("show-filters").addEventListener("click", () => $("filters").classList.toggle("hidden"));
+$("plan-years-btn").addEventListener("click", () => $("planYearList").classList.toggle("hidden"));
+for (const [year, count] of YEARS) {
+  const a = document.createElement("a");
+  a.href = "#";
+  a.textContent = year + " (" + count + ")";
+  a.addEventListener("click", e => { e.preventDefault(); state.year = year; renderBreadcrumbs(); });
+  $("planYearList").appendChild(a);
+  $("planYearList").appendChild(document.createElement("br"));
+}
+if (THROTTLED) showModal();
+</script>
+</body>
+</html>
+"""
+
+
+def fake_pdf(title: str) -> bytes:
+    return (
+        b"%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\n% "
+        + title.encode("utf-8", "replace")
+        + b"\ntrailer << /Root 1 0 R >>\n%%EOF\n"
+    )
+
+
+def filings_for(plans, years=("2024",)) -> list[dict]:
+    """Filings for a list of plan names, or for plan registry rows (which adds ein / pn)."""
+    if isinstance(plans, pd.DataFrame):
+        plans = plans[["Full_Plan_Name", "EIN", "PN"]].itertuples(index=False)
+    else:
+        plans = ((name, 0, 0) for name in plans)
+
+    filings = []
+    for i, (name, ein, pn) in enumerate(plans):
+        for year in years:
+            filing = {"planname": str(name), "planyear": year, "ackid": f"{year}{i:08d}"}
+            if ein:
+                filing.update(ein=f"{ein:09d}", pn=f"{pn:03d}")
+            filings.append(filing)
+    return filings
+
+
+def filings_from_csv(csv_path: str, years=("2024",), limit: int = 1000) -> list[dict]:
+    return filings_for(read_registry(csv_path).head(limit), years)
+
+
+class MockEfastHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+    filings: list[dict] = []
+    by_ack_id: dict[str, dict] = {}
+    latency = 0.0
+    throttle_rate = 0.0
+    throttle_status = 429
+    download_error_rate = 0.0
+    rng = random.Random()
+    stats: Counter = Counter()
+    stats_lock = threading.Lock()
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+
+    def _page(self) -> bytes:
+        years = Counter(f["planyear"] for f in self.filings)
+        throttled = self.rng.random() < self.throttle_rate
+        if throttled:
+            self._count("page_throttled")
+        page = (SEARCH_PAGE
+                .replace("__YEARS__", json.dumps(sorted(years.items(), reverse=True)))
+                .replace("__THROTTLED__", "true" if throttled else "false")
+                .replace("__SEARCH_PATH__", SEARCH_PATH)
+                .replace("__PAGE_SIZE__", str(PAGE_SIZE))
+                .replace("__DOWNLOAD_PATH__", DOWNLOAD_PATH))
+        return page.encode("utf-8")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self._delay()
+
+        if url.path in (PAGE_PATH, PAGE_PATH.rstrip("/")):
+            self._count("pages")
+            self._send(200, self._page(), "text/html; charset=utf-8")
+            return
+
+        if url.path == SEARCH_PATH:
+            self._count("searches")
+            if self.rng.random() < self.throttle_rate:
+                self._count("throttled")
+                self._send(self.throttle_status, b"Please try back later", "text/plain", {"Retry-After": "1"})
+                return
+            q = params.get("q", "").strip()
+            words = [w.upper() for w in q.split()]
+            year = params.get("planYear")
+            hits = [
+                {"id": f["ackid"], "fields": f}
+                for f in self.filings
+                # a 9-digit query is a sponsor EIN, anything else is matched word by word on the name
+                if (f.get("ein") == q if q.isdigit() and len(q) == 9 else all(w in f["planname"].upper() for w in words))
+                and (not year or f["planyear"].startswith(year))
+            ]
+            start, size = int(params.get("start", 0)), int(params.get("size", PAGE_SIZE))
+            body = json.dumps({"hits": {"found": len(hits), "start": start,
+                                        "hit": hits[start:start + size]}}).encode("utf-8")
+            self._send(200, body, "application/json")
+            return
+
+        if url.path.startswith(DOWNLOAD_PATH + "/"):
+            self._count("downloads")
+            ack_id = url.path.rsplit("/", 1)[-1]
+            filing = self.by_ack_id.get(ack_id)
+            if filing is None:
+                self._send(404, b"not found", "text/plain")
+            elif self.rng.random() < self.download_error_rate:
+                self._count("download_errors")
+                self._send(500, b"server error", "text/plain")
+            else:
+                self._send(200, fake_pdf(filing["planname"]), "application/pdf",
+                           {"Content-Disposition": f'attachment; filename="{ack_id}.pdf"'})
+            return
+
+        self._send(404, b"not found", "text/plain")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(filings: list[dict], port: int = 0, latency: float = 0.0, throttle_rate: float = 0.0,
+                 download_error_rate: float = 0.0, seed: int | None = None, throttle_status: int = 429):
+    """Start the stand-in in a background thread; returns (server, base_url).
+
+    Request counters (pages, searches, throttled, downloads, download_errors)
+    are in server.RequestHandlerClass.stats.
+    """
+    handler = type("Handler", (MockEfastHandler,), {
+        "filings": filings,
+        "by_ack_id": {f["ackid"]: f for f in filings},
+        "latency": latency,
+        "throttle_rate": throttle_rate,
+        "throttle_status": throttle_status,
+        "download_error_rate": download_error_rate,
+        "rng": random.Random(seed),
+        "stats": Counter(),
+        "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for efast")
+    parser.add_argument("--port", type=int, default=8055)
+    parser.add_argument("--csv", default="filtered_401k_403b_plans.csv")
+    parser.add_argument("--limit", type=int, default=1000, help="number of plans to serve filings for")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds added to every request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="share of searches and page loads answered with the try-later modal")
+    parser.add_argument("--download-error-rate", type=float, default=0.0, help="share of downloads that fail")
+    args = parser.parse_args()
+
+    server, base_url = start_server(filings_from_csv(args.csv, limit=args.limit), args.port, args.latency,
+                                    args.throttle_rate, args.download_error_rate)
+    print(f"Mock efast running at {base_url} (search page: {base_url}{PAGE_PATH}, Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Requests: {dict(server.RequestHandlerClass.stats)}")
+
+
+if __name__ == "__main__":
+    main()
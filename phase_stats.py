@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-phase latency recording and adaptive timeouts for the Step 2 loop.
+
+Every phase of a plan (search submit, results render, row scan, download,
+breadcrumb clear) is timed into a shared PhaseStats. Timeouts for the next
+waits are derived from a rolling p95 of the phase's successful durations
+instead of fixed 10/20 s values, and a text histogram per phase is printed
+at the end of the run. capture() additionally hands the spans recorded by one
+thread to the caller, for per-plan traces; download spans carry the bytes
+actually transferred.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class PhaseStats:
+    def __init__(self, window: int = 200, min_samples: int = 10,
+                 factor: float = 3.0, floor: float = 2.0, ceiling: float = 40.0):
+        self.window = window
+        self.min_samples = min_samples
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))  # successes only
+        self._all = defaultdict(list)
+        self._timeouts = defaultdict(int)
+        self._local = threading.local()
+
+    def record(self, phase: str, seconds: float, ok: bool = True, key=None, size: int = 0):
+        spans = getattr(self._local, "spans", None)
+        if spans is not None:
+            spans.append((phase, seconds, ok, key, size))
+        with self._lock:
+            self._all[phase].append(seconds)
+            if ok:
+                self._recent[phase].append(seconds)
+            else:
+                self._timeouts[phase] += 1
+
+    @contextmanager
+    def time(self, phase: str, timeout_errors: tuple = (TimeoutError,), key=None):
+        """
+        Time a block; blocks that end in one of timeout_errors count as
+        timeouts. The block can set span["size"] to the bytes it transferred.
+        """
+        span = {"size": 0}
+        t0 = time.perf_counter()
+        try:
+            yield span
+        except timeout_errors:
+            self.record(phase, time.perf_counter() - t0, ok=False, key=key, size=span["size"])
+            raise
+        self.record(phase, time.perf_counter() - t0, key=key, size=span["size"])
+
+    @contextmanager
+    def capture(self):
+        """Collect (phase, seconds, ok, key, size) for every span this thread records inside the block."""
+        spans = []
+        self._local.spans = spans
+        try:
+            yield spans
+        finally:
+            self._local.spans = None
+
+    def p95(self, phase: str) -> float | None:
+        """Rolling p95 of the phase's successful durations; None until enough samples exist."""
+        with self._lock:
+            recent = list(self._recent[phase])
+        return _percentile(recent, 0.95) if len(recent) >= self.min_samples else None
+
+    def timeout(self, phase: str, default: float) -> float:
+        """Rolling p95 x factor, clamped; the default until enough samples exist."""
+        with self._lock:
+            recent = list(self._recent[phase])
+        if len(recent) < self.min_samples:
+            return default
+        return max(self.floor, min(self.ceiling, _percentile(recent, 0.95) * self.factor))
+
+    def histogram(self) -> str:
+        with self._lock:
+            phases = {p: list(v) for p, v in self._all.items()}
+            timeouts = dict(self._timeouts)
+
+        lines = []
+        for phase, values in phases.items():
+            lines.append(
+                f"{phase}: n={len(values)} total={sum(values):.1f}s "
+                f"p50={_percentile(values, 0.5):.2f}s p95={_percentile(values, 0.95):.2f}s "
+                f"timeouts={timeouts.get(phase, 0)}"
+            )
+            counts = [0] * (len(BUCKETS) + 1)
+            for v in values:
+                counts[next((i for i, b in enumerate(BUCKETS) if v <= b), len(BUCKETS))] += 1
+            labels = [f"<={b}s" for b in BUCKETS] + [f">{BUCKETS[-1]}s"]
+            peak = max(counts)
+            for label, count in zip(labels, counts):
+                if count:
+                    lines.append(f"  {label:>7} {count:6d} {'#' * max(1, round(30 * count / peak))}")
+        return "\n".join(lines)
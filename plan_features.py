@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+Rule engine for plan-design features in filing text.
+
+All rules (match tiers, match caps, safe harbor, vesting schedules,
+auto-enrollment and auto-escalation) are compiled into ONE case-insensitive
+alternation with a named group per rule, so each document is scanned in a
+single finditer pass; m.lastgroup says which rule fired. Documents are
+processed in batches over a process pool and the result is a typed feature
+table, one row per filing.
+
+Features are stored back into the extraction cache (keyed by PDF hash, with
+RULES_VERSION), so unchanged filings are not rescanned.
+"""
+
+import argparse
+import gzip
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from extraction_cache import ExtractionCache
+
+RULES_VERSION = 2
+FEATURES_CSV = "plan_features.csv"
+
+_NUM = r"\d{1,3}(?:\.\d+)?"
+_WORD_NUM = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+_YEARS = r"[1-6]|one|two|three|four|five|six"
+
+# (rule name, pattern); sub-groups are prefixed with the rule name to stay unique
+RULES = [
+    ("match_tier", rf"(?P<match_tier_rate>{_NUM})\s*%\s+of\s+(?:the\s+|a\s+participant'?s\s+)?"
+                   rf"(?:(?:elective\s+)?(?:deferrals?|contributions?|compensation)\s+)?"
+                   rf"(?:first|next|up\s+to)\s+(?P<match_tier_upto>{_NUM})\s*%"),
+    ("match_cap", rf"(?:not\s+to\s+exceed|(?:shall|will|may|does)\s+not\s+exceed|maximum\s+of|capped\s+at|"
+                  rf"limited\s+to)\s+(?P<match_cap_pct>{_NUM})\s*%\s+of\s+(?:[\w']+\s+){{0,2}}compensation"),
+    ("safe_harbor", r"safe[\s-]+harbou?r"),
+    ("vest_immediate", r"(?:fully|100\s*%|immediately)\s+vested"),
+    ("vest_cliff", rf"(?P<vest_cliff_years>{_YEARS})[\s-]*years?\s+cliff"),
+    ("vest_graded", rf"(?P<vest_graded_years>{_YEARS})[\s-]*years?\s+(?:graded|graduated)"),
+    ("auto_rate", rf"(?:default|automatic)\s+(?:deferral|contribution|enrollment)\s+(?:rate|percentage|amount)?\s*"
+                  rf"(?:of|is|equal\s+to|will\s+be)?\s*(?P<auto_rate_pct>{_NUM})\s*%"),
+    ("auto_enroll", r"automatic(?:ally)?\s+enrol(?:l|lment|led)\b|auto[\s-]enrol\w*|"
+                    r"eligible\s+automatic\s+contribution\s+arrangement|\bEACA\b|\bQACA\b"),
+    ("auto_escalate", r"automatic(?:ally)?\s+(?:annual\s+)?(?:increase|escalat)\w*|auto[\s-]escalat\w*"),
+]
+
+COMBINED = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in RULES), re.IGNORECASE)
+
+FEATURE_DTYPES = {
+    "match_tiers": "string",
+    "match_max_pct": "Float32",
+    "match_cap_pct": "Float32",
+    "safe_harbor": "boolean",
+    "vesting": pd.CategoricalDtype(["immediate", "cliff", "graded", "unknown"]),
+    "vesting_years": "Int8",
+    "auto_enroll": "boolean",
+    "auto_enroll_rate_pct": "Float32",
+    "auto_escalate": "boolean",
+    "rule_hits": "Int32",
+}
+
+
+def _years(token: str) -> int:
+    token = token.lower()
+    return _WORD_NUM.get(token) or int(token)
+
+
+def extract_features(text: str) -> dict:
+    """One pass of the combined pattern over a document."""
+    tiers, caps, rates = [], [], []
+    flags = {"safe_harbor": False, "auto_enroll": False, "auto_escalate": False}
+    vesting, vesting_years = "unknown", None
+    hits = 0
+
+    for m in COMBINED.finditer(text):
+        hits += 1
+        rule = m.lastgroup
+        if rule == "match_tier":
+            tier = (float(m["match_tier_rate"]), float(m["match_tier_upto"]))
+            if tier[0] <= 100 and tier[1] <= 100 and tier not in tiers:
+                tiers.append(tier)
+        elif rule == "match_cap":
+            caps.append(float(m["match_cap_pct"]))
+        elif rule == "auto_rate":
+            rates.append(float(m["auto_rate_pct"]))
+            flags["auto_enroll"] = True
+        elif rule in flags:
+            flags[rule] = True
+        elif rule == "vest_immediate" and vesting == "unknown":
+            vesting = "immediate"
+        elif rule in ("vest_cliff", "vest_graded") and vesting in ("unknown", "immediate"):
+            # a schedule beats a generic "fully vested" mention
+            vesting = rule.split("_")[1]
+            vesting_years = _years(m[f"{rule}_years"])
+
+    return {
+        "match_tiers": ";".join(f"{r:g}@{u:g}" for r, u in tiers) or None,
+        "match_max_pct": sum(r * u / 100 for r, u in tiers) if tiers else None,
+        "match_cap_pct": min(caps) if caps else None,
+        "safe_harbor": flags["safe_harbor"],
+        "vesting": vesting,
+        "vesting_years": vesting_years,
+        "auto_enroll": flags["auto_enroll"],
+        "auto_enroll_rate_pct": rates[0] if rates else None,
+        "auto_escalate": flags["auto_escalate"],
+        "rule_hits": hits,
+        "rules_version": RULES_VERSION,
+    }
+
+
+def _extract_text_path(text_path: str) -> dict:
+    # whole-document read is fine here: text is a small fraction of the PDF size
+    with gzip.open(text_path, "rt", encoding="utf-8") as f:
+        return extract_features(f.read())
+
+
+def to_feature_table(rows: list[dict]) -> pd.DataFrame:
+    df = pd.DataFrame(rows)
+    for col, dtype in FEATURE_DTYPES.items():
+        if col not in df.columns:
+            df[col] = None
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def build_feature_table(store_dir: Path = Path("text_store"), output_file: str = FEATURES_CSV,
+                        workers: int | None = None, batch_size: int = 64) -> pd.DataFrame:
+    index_df = pd.read_csv(store_dir / "index.csv",
+                           dtype={"sha256": str, "plan_name": str, "plan_key": "Int64", "year": str})
+    index_df = index_df[index_df["status"].isin(["ok", "cached"])]
+    index_df = index_df[index_df["text_path"].map(lambda p: Path(p).exists()).astype(bool)]
+
+    cache = ExtractionCache(store_dir)
+    features, todo = {}, []
+    for sha256, text_path in zip(index_df["sha256"], index_df["text_path"]):
+        entry = cache.get(sha256)
+        cached = entry and entry["features"]
+        if cached and cached.get("rules_version") == RULES_VERSION:
+            features[sha256] = cached
+        elif sha256 not in features:
+            features[sha256] = None
+            todo.append((sha256, text_path))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+    print(f"Extracting features from {len(todo)} filings ({len(index_df) - len(todo)} cached) ...")
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_extract_text_path, [p for _, p in todo], chunksize=batch_size)
+            for (sha256, _), row in zip(todo, results):
+                features[sha256] = row
+                cache.set_features(sha256, row)
+    cache.close()
+
+    # plan_name / plan_key / year are only in indexes built from the filing store
+    plan_names = index_df["plan_name"] if "plan_name" in index_df else [""] * len(index_df)
+    plan_keys = index_df["plan_key"] if "plan_key" in index_df else [pd.NA] * len(index_df)
+    years = index_df["year"] if "year" in index_df else [""] * len(index_df)
+    rows = [{"pdf": pdf, "plan_name": plan_name, "plan_key": plan_key, "year": year, "sha256": sha256,
+             **features[sha256]}
+            for pdf, plan_name, plan_key, year, sha256 in
+            zip(index_df["pdf"], plan_names, plan_keys, years, index_df["sha256"])]
+    table = to_feature_table(rows)
+    if output_file:
+        table.to_csv(store_dir / output_file, index=False)
+        print(f"The feature table has been saved to: {store_dir / output_file}")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract plan-design features from extracted filing text")
+    parser.add_argument("--store-dir", default="text_store")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    build_feature_table(Path(args.store_dir), workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
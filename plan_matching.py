@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Query-level batching for Step 2.
+
+Many plan names collapse to the same search query once plan_names.search_query
+drops PLAN / TRUST / PROFIT SHARING etc. These helpers group plans by query
+so each distinct search runs once, then match every plan in the group
+against the parsed result rows. Plans with a registry key (sponsor EIN +
+plan number, see plan_registry.py) are matched on it exactly; name
+similarity is only the fallback for plans without one, or for result rows
+that carry no key. Each row goes to at most one plan, so two plans never
+end up with the same PDF.
+"""
+
+from difflib import SequenceMatcher
+
+from plan_names import canonical_name
+
+MIN_SIMILARITY = 0.6
+
+
+def group_by_query(plan_names: list[str], query_fn) -> list[tuple[str, list[str]]]:
+    """[(query, [plan, ...]), ...] in order of first appearance."""
+    groups = {}
+    for name in plan_names:
+        groups.setdefault(query_fn(name), []).append(name)
+    return list(groups.items())
+
+
+def name_similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, canonical_name(a), canonical_name(b)).ratio()
+
+
+def _row_key(row: dict) -> tuple[int, int] | None:
+    try:
+        return int(row["ein"]), int(row["pn"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def assign_rows(plans: list[str], rows: list[dict], year: str, keys: dict | None = None,
+                min_similarity: float = MIN_SIMILARITY, names: dict | None = None) -> dict[str, dict | None]:
+    """
+    Pair plans with result rows of the given year. rows are dicts with at
+    least plan_name and plan_year, plus ein / pn when the source shows them.
+    keys maps plan -> (EIN, PN): those plans take the row with that exact key
+    first; the rest are paired greedily, best name similarity first. plans
+    are plan ids (plan_registry.plan_id); names maps the ids that are not a
+    name themselves.
+    """
+    candidates = [r for r in rows if year in r["plan_year"]]
+    assigned = {plan: None for plan in plans}
+    used_rows = set()
+
+    keys = keys or {}
+    by_key = {}
+    for j, row in enumerate(candidates):
+        row_key = _row_key(row)
+        if row_key is not None:
+            by_key.setdefault(row_key, j)
+    for plan in plans:
+        j = by_key.get(keys.get(plan))
+        if j is not None and j not in used_rows:
+            assigned[plan] = candidates[j]
+            used_rows.add(j)
+
+    # a keyed plan whose key is not among keyed rows is simply not in the results
+    fuzzy = [plan for plan in plans if assigned[plan] is None and not (by_key and plan in keys)]
+    # canonical forms once per name, not once per pair
+    names = names or {}
+    fuzzy_names = [canonical_name(names.get(plan, plan)) for plan in fuzzy]
+    row_names = [canonical_name(row["plan_name"]) for row in candidates]
+    pairs = sorted(
+        (
+            (SequenceMatcher(None, plan, row_names[j]).ratio(), i, j)
+            for i, plan in enumerate(fuzzy_names)
+            for j in range(len(candidates))
+            if j not in used_rows
+        ),
+        reverse=True,
+    )
+
+    for score, i, j in pairs:
+        if score < min_similarity:
+            break
+        if assigned[fuzzy[i]] is not None or j in used_rows:
+            continue
+        assigned[fuzzy[i]] = candidates[j]
+        used_rows.add(j)
+    return assigned
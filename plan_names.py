@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Plan name normalization, shared by every stage.
+
+Three derived forms of a plan name:
+
+    Search_Query  the name without legal suffixes and plan-type words, at
+                  most 8 words: what is typed into the efast search box
+    File_Slug     the name made safe as a file name, at most 120 characters
+    Sponsor_Key   uppercase ASCII, punctuation and 401(k) / 403(b) removed,
+                  suffixes and plan-type words dropped: a canonical sponsor
+                  key for grouping plans when the EIN is missing
+
+normalize_names() computes all three for a whole column with pandas string
+operations (pyarrow compute kernels on the default string dtype), so Step 1
+writes them once for every plan and later stages read the columns instead
+of running per-row regex loops. The scalar functions give the same results
+for a single name, for callers that only have one.
+"""
+
+import re
+import unicodedata
+
+import pandas as pd
+
+DROP_WORDS = (
+    "INC", "INC.", "LLC", "L.L.C.", "CO", "CO.", "CORP", "CORPORATION",
+    "LTD", "LIMITED", "TRUST", "PLAN", "PROFIT", "SHARING", "SAVINGS",
+    "RETIREMENT", "EMPLOYEE", "BENEFIT",
+)
+MAX_QUERY_WORDS = 8
+MAX_SLUG_LEN = 120
+NAME_COLUMNS = ["Search_Query", "File_Slug", "Sponsor_Key"]
+
+_DROP = frozenset(DROP_WORDS)
+# tokens are whitespace-delimited; doubling the spaces gives every token its own
+# pair of delimiters so back-to-back drop words are all matched in one pass
+_DROP_PATTERN = "(?i) (?:" + "|".join(re.escape(w) for w in sorted(DROP_WORDS, key=len, reverse=True)) + ") "
+_SPONSOR_DROP = frozenset(w.replace(".", "") for w in DROP_WORDS) | {"P C", "PC", "L L C"}
+_SPONSOR_DROP_PATTERN = (" (?:" + "|".join(w.replace(" ", "  ") for w in sorted(_SPONSOR_DROP, key=len, reverse=True))
+                         + ") ")
+_UNSAFE_CHARS = r'[\\/*?:"<>|]'
+# everything str.split() splits on; RE2's \s (used by the pyarrow string kernels) is ASCII only
+_SPACE_CHARS = "\\s\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+_WHITESPACE = f"[{_SPACE_CHARS}]+"
+
+
+# ---------- one name ----------
+def search_query(plan_name: str, max_words: int = MAX_QUERY_WORDS) -> str:
+    s = " ".join(str(plan_name).replace("\xa0", " ").split())
+    s = " ".join(re.sub(r"[&(),]", " ", s).split())
+    words = [w for w in s.split() if w.upper() not in _DROP]
+    return " ".join(words[:max_words]) if words else s
+
+
+def filename_slug(plan_name: str, max_len: int = MAX_SLUG_LEN) -> str:
+    name = re.sub(r"\s+", " ", str(plan_name)).strip()
+    name = re.sub(_UNSAFE_CHARS, "_", name)
+    return name[:max_len]
+
+
+def canonical_name(name: str) -> str:
+    """Uppercase ASCII letters and digits separated by single spaces."""
+    s = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii").upper()
+    return " ".join(re.sub(r"[^A-Z0-9 ]", " ", s).split())
+
+
+def sponsor_key(plan_name: str) -> str:
+    s = re.sub(r"40[13]\s*\(\s*[KB]\s*\)", " ", str(plan_name), flags=re.IGNORECASE)
+    s = f" {'  '.join(canonical_name(s).split())} "
+    s = " ".join(re.sub(_SPONSOR_DROP_PATTERN, " ", s).split())
+    return s
+
+
+# ---------- a whole column ----------
+def _collapse(s: pd.Series) -> pd.Series:
+    # only ASCII spaces are left by the time this runs
+    return s.str.replace(r" {2,}", " ", regex=True).str.strip()
+
+
+def _drop_words(s: pd.Series, pattern: str) -> pd.Series:
+    return _collapse((" " + s.str.replace(" ", "  ", regex=False) + " ").str.replace(pattern, " ", regex=True))
+
+
+def normalize_names(names: pd.Series, max_words: int = MAX_QUERY_WORDS,
+                    max_len: int = MAX_SLUG_LEN) -> pd.DataFrame:
+    """Search_Query, File_Slug and Sponsor_Key for every name, as string columns on names' index."""
+    names = names.astype("string")
+    base = names.str.replace(_WHITESPACE, " ", regex=True).str.strip()
+
+    # Search_Query: whitespace and &(), collapse to single spaces in one pass
+    cleaned = names.str.replace(f"[{_SPACE_CHARS}&(),]+", " ", regex=True).str.strip()
+    kept = _drop_words(cleaned, _DROP_PATTERN)
+    first_words = kept.str.replace(rf"^((?:[^ ]+ ){{{max_words - 1}}}[^ ]+) .*$", r"\1", regex=True)
+    query = first_words.where(first_words != "", cleaned)
+
+    # File_Slug
+    slug = base.str.replace(_UNSAFE_CHARS, "_", regex=True).str.slice(0, max_len)
+
+    # Sponsor_Key
+    ascii_upper = base.str.normalize("NFKD").str.replace(r"[^\x00-\x7f]", "", regex=True).str.upper()
+    # 401(k) / 403(b) and every other non-alphanumeric character in one pass
+    canonical = _collapse(ascii_upper.str.replace(r"40[13] *\( *[KB] *\)|[^A-Z0-9 ]", " ", regex=True))
+    key = _drop_words(canonical, _SPONSOR_DROP_PATTERN)
+
+    return pd.DataFrame({"Search_Query": query, "File_Slug": slug, "Sponsor_Key": key}).astype("string")
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+Typed plan registry: the identity of every plan Step 1 selects.
+
+One row per plan key (sponsor EIN + three-digit plan number), with the name
+and ACK_ID of the first filing it was seen in:
+
+    Full_Plan_Name  string
+    EIN             int32   (9 digits fit)
+    PN              int16
+    ACK_ID          string
+    Plan_Key        int64   EIN * 1000 + PN; NO_KEY when the filing has no usable EIN / PN
+    Participants    int32   participants at the beginning of the year; 0 when unknown
+    Search_Query, File_Slug, Sponsor_Key
+                    string  normalized forms of the name (plan_names.py)
+
+Step 1 deduplicates on Plan_Key (rows without a key fall back to the name),
+and Step 2 searches by EIN and matches result rows on (EIN, PN) exactly
+instead of by fuzzy name similarity. Participants lets Step 2's scheduler
+(crawl_scheduler.py) fetch the biggest plans first.
+
+Different sponsors can file under the same plan name, so Step 2 (ledger,
+filing store, results) tracks each plan by its plan id: "EIN-PN" for keyed
+plans, the name only for plans without a key.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from plan_names import NAME_COLUMNS, normalize_names, search_query, sponsor_key
+
+REGISTRY_COLUMNS = ["Full_Plan_Name", "EIN", "PN", "ACK_ID", "Plan_Key", "Participants", *NAME_COLUMNS]
+REGISTRY_DTYPES = {"Full_Plan_Name": "string", "EIN": "int32", "PN": "int16", "ACK_ID": "string",
+                   "Plan_Key": "int64", "Participants": "int32", **{c: "string" for c in NAME_COLUMNS}}
+NO_KEY = -1
+
+
+def plan_keys(ein: pd.Series, pn: pd.Series) -> tuple[pd.Series, pd.Series, pd.Series]:
+    """Vectorized (EIN, PN, Plan_Key) from the raw text columns."""
+    ein_num = pd.to_numeric(ein, errors="coerce")
+    pn_num = pd.to_numeric(pn, errors="coerce")
+    valid = ein_num.between(1, 999_999_999) & pn_num.between(1, 999)
+    key = (ein_num * 1000 + pn_num).where(valid, NO_KEY)
+    return (ein_num.where(valid, 0).astype("int32"), pn_num.where(valid, 0).astype("int16"),
+            key.astype("int64"))
+
+
+def plan_id(name: str, plan_key: int | None = NO_KEY) -> str:
+    """The plan's identity in Step 2: "EIN-PN" when it has a key, its name otherwise."""
+    if plan_key is None or plan_key == NO_KEY:
+        return str(name)
+    return f"{plan_key // 1000:09d}-{plan_key % 1000:03d}"
+
+
+def plan_ids(batch: pd.DataFrame) -> pd.Series:
+    """Vectorized plan_id() over registry rows."""
+    keyed = (batch["EIN"].astype("string").str.zfill(9) + "-" + batch["PN"].astype("string").str.zfill(3))
+    return keyed.where(batch["Plan_Key"] != NO_KEY, batch["Full_Plan_Name"].astype("string"))
+
+
+def with_names(batch: pd.DataFrame) -> pd.DataFrame:
+    """Fill in the normalized name columns (one vectorized pass over the batch)."""
+    return batch.assign(**normalize_names(batch["Full_Plan_Name"]))
+
+
+def to_registry(names: pd.Series, ein: pd.Series | None = None, pn: pd.Series | None = None,
+                ack_id: pd.Series | None = None, participants: pd.Series | None = None,
+                normalize: bool = True) -> pd.DataFrame:
+    """
+    Registry rows (not yet deduplicated) for one chunk of filings. Step 1
+    passes normalize=False and calls with_names() after deduplication, so
+    each plan's name is normalized once.
+    """
+    n = len(names)
+    if ein is not None and pn is not None:
+        ein, pn, key = plan_keys(ein, pn)
+    else:
+        ein = pd.Series(np.zeros(n, dtype="int32"), index=names.index)
+        pn = pd.Series(np.zeros(n, dtype="int16"), index=names.index)
+        key = pd.Series(np.full(n, NO_KEY, dtype="int64"), index=names.index)
+    ack_id = ack_id if ack_id is not None else pd.Series(pd.NA, index=names.index)
+    if participants is not None:
+        participants = pd.to_numeric(participants, errors="coerce").clip(0, np.iinfo("int32").max).fillna(0)
+    else:
+        participants = pd.Series(np.zeros(n, dtype="int32"), index=names.index)
+    batch = pd.DataFrame({"Full_Plan_Name": names, "EIN": ein, "PN": pn, "ACK_ID": ack_id,
+                          "Plan_Key": key, "Participants": participants, **{c: pd.NA for c in NAME_COLUMNS}})
+    batch = batch.astype(REGISTRY_DTYPES)
+    return with_names(batch) if normalize else batch
+
+
+def read_registry(csv_path) -> pd.DataFrame:
+    """
+    Load Step 1's output; older files get NO_KEY (name-only) and 0
+    participants where missing, and their name columns computed here.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    if "Full_Plan_Name" not in header:
+        raise ValueError(f"Missing 'Full_Plan_Name' in {csv_path}. Columns: {header.tolist()}")
+    if not {"EIN", "PN", "Plan_Key"} <= set(header):
+        names = pd.read_csv(csv_path, usecols=["Full_Plan_Name"], dtype="string")["Full_Plan_Name"].dropna()
+        return to_registry(names.reset_index(drop=True))
+    df = pd.read_csv(csv_path, usecols=[c for c in REGISTRY_COLUMNS if c in header],
+                     dtype={"Full_Plan_Name": "string", "ACK_ID": "string"})
+    if "Participants" not in df.columns:
+        df["Participants"] = 0
+    missing_names = not set(NAME_COLUMNS) <= set(df.columns)
+    for col in NAME_COLUMNS:
+        df[col] = df.get(col, pd.NA)
+    df = df.dropna(subset=["Full_Plan_Name"]).astype(REGISTRY_DTYPES).reset_index(drop=True)
+    return with_names(df) if missing_names else df
+
+
+class PlanRegistry:
+    """
+    Plan id -> name, (EIN, PN), participants, search query and sponsor for Step 2,
+    filled batch by batch as Step 1 streams. Plain names (no registry row)
+    are their own id.
+    """
+
+    def __init__(self):
+        self._names: dict[str, str] = {}
+        self._keys: dict[str, tuple[int, int]] = {}
+        self._participants: dict[str, int] = {}
+        self._queries: dict[str, str] = {}
+        self._sponsors: dict[str, str] = {}
+
+    def add(self, batch: pd.DataFrame) -> list[str]:
+        """Register a batch of registry rows; returns their plan ids in order."""
+        ids = [sys.intern(str(pid)) for pid in plan_ids(batch)]
+        keyed = (batch["Plan_Key"] != NO_KEY).tolist()
+        for pid, name, ein, pn, has_key in zip(ids, batch["Full_Plan_Name"], batch["EIN"].tolist(),
+                                               batch["PN"].tolist(), keyed):
+            if has_key and pid not in self._keys:
+                self._keys[pid] = (ein, pn)
+                self._names[pid] = str(name)
+        for pid, participants in zip(ids, batch["Participants"].tolist()):
+            if participants > 0:
+                self._participants.setdefault(pid, participants)
+        for pid, query, sponsor in zip(ids, batch["Search_Query"], batch["Sponsor_Key"]):
+            self._queries.setdefault(pid, query)
+            self._sponsors.setdefault(pid, sponsor)
+        return ids
+
+    def name(self, plan: str) -> str:
+        return self._names.get(plan, plan)
+
+    def key(self, plan: str) -> tuple[int, int] | None:
+        return self._keys.get(plan)
+
+    def plan_key(self, plan: str) -> int | None:
+        """EIN * 1000 + PN, or None for a plan without a key."""
+        key = self._keys.get(plan)
+        return key[0] * 1000 + key[1] if key else None
+
+    def participants(self, plan: str) -> int:
+        return self._participants.get(plan, 0)
+
+    def search_query(self, plan: str) -> str:
+        """Step 1's precomputed query; computed on the spot for plans that came without one."""
+        query = self._queries.get(plan)
+        return query if isinstance(query, str) else search_query(self.name(plan))
+
+    def sponsor_key(self, plan: str) -> str:
+        """Step 1's precomputed Sponsor_Key, likewise computed on the spot without one."""
+        sponsor = self._sponsors.get(plan)
+        return sponsor if isinstance(sponsor, str) else sponsor_key(self.name(plan))
+
+    @property
+    def keys(self) -> dict[str, tuple[int, int]]:
+        """The live plan id -> (EIN, PN) dict, as taken by plan_matching.assign_rows."""
+        return self._keys
+
+    @property
+    def names(self) -> dict[str, str]:
+        """The live plan id -> name dict for keyed plans (any other id is the name itself)."""
+        return self._names
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Out-of-core segmentation of plans into archetypes.
+
+Streams the plan feature table (text_store/plan_features.csv) in
+mini-batches, turns each batch into a float32 NumPy matrix with vectorized
+column ops, and fits MiniBatchKMeans incrementally with partial_fit. Memory
+is bounded by the batch size, not by the number of plans or years:
+
+    pass 1  running mean / variance for standardization
+    pass 2+ partial_fit, one or more epochs
+    last    assign a segment to every plan -> plan_segments.csv (appended per batch)
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+
+FEATURES_CSV = Path("text_store") / "plan_features.csv"
+SEGMENTS_CSV = Path("text_store") / "plan_segments.csv"
+
+NUMERIC = ["match_max_pct", "match_cap_pct", "vesting_years", "auto_enroll_rate_pct"]
+FLAGS = ["safe_harbor", "auto_enroll", "auto_escalate"]
+VESTING = ["immediate", "cliff", "graded"]
+MATRIX_COLUMNS = NUMERIC + FLAGS + [f"vesting_{v}" for v in VESTING]
+READ_DTYPES = {**{c: "float32" for c in NUMERIC}, **{c: "boolean" for c in FLAGS}, "vesting": "string"}
+# which plan and year each row is; plan_name / plan_key / year are missing from older feature tables
+ID_COLUMNS = ["pdf", "plan_name", "plan_key", "year", "sha256"]
+ID_DTYPES = {"pdf": "string", "plan_name": "string", "plan_key": "Int64", "year": "string", "sha256": "string"}
+SAMPLE_ROWS = 1000
+
+
+def batch_size_for(memory_mb: float, features_csv: Path = FEATURES_CSV) -> int:
+    # the pandas frame, measured on a first chunk (plan names make it far bigger than the matrix),
+    # plus the float32 matrix and its standardized copy
+    sample = next(iter_batches(features_csv, SAMPLE_ROWS), None)
+    frame_bytes = sample.memory_usage(deep=True).sum() / len(sample) if sample is not None and len(sample) else 0
+    bytes_per_row = frame_bytes + 2 * len(MATRIX_COLUMNS) * 4
+    return max(1000, int(memory_mb * 1024 ** 2 / bytes_per_row))
+
+
+def iter_batches(features_csv: Path, batch_size: int):
+    header = pd.read_csv(features_csv, nrows=0).columns
+    id_columns = [c for c in ID_COLUMNS if c in header]
+    yield from pd.read_csv(features_csv, usecols=id_columns + list(READ_DTYPES),
+                           dtype={**{c: ID_DTYPES[c] for c in id_columns}, **READ_DTYPES}, chunksize=batch_size)
+
+
+def to_matrix(df: pd.DataFrame) -> np.ndarray:
+    """Vectorized feature matrix, float32, missing values as 0."""
+    X = np.empty((len(df), len(MATRIX_COLUMNS)), dtype=np.float32)
+    X[:, :len(NUMERIC)] = df[NUMERIC].to_numpy(dtype=np.float32, na_value=0.0)
+    X[:, len(NUMERIC):len(NUMERIC) + len(FLAGS)] = df[FLAGS].to_numpy(dtype=np.float32, na_value=0.0)
+    vesting = df["vesting"].to_numpy(dtype=object, na_value="")
+    for j, v in enumerate(VESTING):
+        X[:, len(NUMERIC) + len(FLAGS) + j] = vesting == v
+    return X
+
+
+class RunningScaler:
+    """Mean / std accumulated batch by batch (Chan et al. parallel variance)."""
+
+    def __init__(self, n_features: int):
+        self.n = 0
+        self.mean = np.zeros(n_features, dtype=np.float64)
+        self.m2 = np.zeros(n_features, dtype=np.float64)
+
+    def update(self, X: np.ndarray):
+        if not len(X):
+            return
+        n_b = len(X)
+        mean_b = X.mean(axis=0, dtype=np.float64)
+        m2_b = ((X - mean_b) ** 2).sum(axis=0, dtype=np.float64)
+        delta = mean_b - self.mean
+        total = self.n + n_b
+        self.mean += delta * n_b / total
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / total
+        self.n = total
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        std = np.sqrt(self.m2 / max(self.n, 1))
+        std[std == 0] = 1.0
+        return ((X - self.mean) / std).astype(np.float32)
+
+    def inverse_transform(self, X: np.ndarray) -> np.ndarray:
+        std = np.sqrt(self.m2 / max(self.n, 1))
+        std[std == 0] = 1.0
+        return X * std + self.mean
+
+
+def segment_plans(features_csv: Path = FEATURES_CSV, output_file: Path = SEGMENTS_CSV, k: int = 6,
+                  epochs: int = 3, batch_size: int | None = None, memory_mb: float = 256,
+                  seed: int = 0) -> pd.DataFrame:
+    batch_size = batch_size or batch_size_for(memory_mb, features_csv)
+    print(f"Segmenting plans into {k} archetypes (batch size {batch_size}) ...")
+
+    scaler = RunningScaler(len(MATRIX_COLUMNS))
+    for df in iter_batches(features_csv, batch_size):
+        scaler.update(to_matrix(df))
+    if scaler.n < k:
+        print(f"Only {scaler.n} plans with features; need at least {k}.")
+        return pd.DataFrame()
+
+    model = MiniBatchKMeans(n_clusters=k, batch_size=min(batch_size, 4096), random_state=seed, n_init=3)
+    for _ in range(epochs):
+        for df in iter_batches(features_csv, batch_size):
+            X = scaler.transform(to_matrix(df))
+            # partial_fit needs at least k rows to initialize
+            if len(X) >= k or hasattr(model, "cluster_centers_"):
+                model.partial_fit(X)
+
+    if output_file.exists():
+        os.remove(output_file)
+    counts = np.zeros(k, dtype=np.int64)
+    for df in iter_batches(features_csv, batch_size):
+        labels = model.predict(scaler.transform(to_matrix(df)))
+        counts += np.bincount(labels, minlength=k)
+        df[[c for c in ID_COLUMNS if c in df]].assign(segment=labels).to_csv(
+            output_file, mode="a", header=not output_file.exists(), index=False
+        )
+
+    centroids = pd.DataFrame(scaler.inverse_transform(model.cluster_centers_), columns=MATRIX_COLUMNS)
+    centroids.insert(0, "plans", counts)
+    centroids.index.name = "segment"
+    print(centroids.round(2).to_string())
+    print(f"The segment assignments have been saved to: {output_file}")
+    return centroids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster plans into archetypes from the plan feature table")
+    parser.add_argument("--features", default=str(FEATURES_CSV))
+    parser.add_argument("--output", default=str(SEGMENTS_CSV))
+    parser.add_argument("--k", type=int, default=6, help="number of segments")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=None, help="rows per mini-batch (overrides --memory-mb)")
+    parser.add_argument("--memory-mb", type=float, default=256, help="memory budget for one batch")
+    args = parser.parse_args()
+
+    segment_plans(Path(args.features), Path(args.output), args.k, args.epochs, args.batch_size, args.memory_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared AIMD rate controller for Step 2 searches.
+
+All sessions (browser or HTTP threads) take a slot before each search. The
+controller caps concurrent searches and paces their start times; successes
+grow the rate and concurrency additively, back-pressure signals shrink both
+multiplicatively, down to min_rate:
+
+    throttled  - efast's "Please try back later" modal / HTTP 429, 503
+    timeout    - the page or request timed out
+    empty      - an empty result that something else made suspicious (it was
+                 slow to come), but only after EMPTY_STREAK in a row from the
+                 same worker (a single empty table is usually just a plan that
+                 isn't there, and several workers each finding one is not a
+                 streak)
+
+Decreases are rate limited by a cooldown, so a burst of signals from many
+sessions hitting the same throttle halves the rate once, not N times.
+"""
+
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+BACKPRESSURE = ("throttled", "timeout", "empty")
+EMPTY_STREAK = 3
+
+
+class _Slot:
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+class RateController:
+    def __init__(self, max_concurrency: int = 8, initial_rate: float = 1.0,
+                 min_rate: float = 0.2, max_rate: float = 10.0,
+                 increase: float = 0.05, decrease: float = 0.5, cooldown: float = 5.0):
+        self.max_concurrency = max_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+
+        self.rate = min(max_rate, initial_rate)  # searches per second
+        self.limit = float(max_concurrency)
+        self.throttles = 0
+        self.counts = Counter()
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._next_at = 0.0
+        self._last_decrease = float("-inf")
+        self._empty_streaks = Counter()  # worker thread -> empty results in a row
+
+    def acquire(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._in_flight < max(1, int(self.limit)))
+            self._in_flight += 1
+            now = time.monotonic()
+            start = max(now, self._next_at)
+            self._next_at = start + 1.0 / self.rate
+        time.sleep(start - now)
+
+    def release(self, outcome: str = "ok"):
+        with self._cond:
+            self._in_flight -= 1
+            self._apply(outcome)
+            self._cond.notify_all()
+
+    def signal(self, outcome: str):
+        """Report an outcome that happened outside a slot (e.g. a modal on page load)."""
+        with self._cond:
+            self._apply(outcome)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout_errors: tuple = (TimeoutError,)):
+        """acquire/release around a block; set slot.outcome to report a signal."""
+        self.acquire()
+        slot = _Slot()
+        try:
+            yield slot
+        except timeout_errors:
+            slot.outcome = "timeout"
+            raise
+        except Exception:
+            if slot.outcome == "ok":
+                slot.outcome = "error"
+            raise
+        finally:
+            self.release(slot.outcome)
+
+    def _apply(self, outcome: str):
+        self.counts[outcome] += 1
+
+        worker = threading.get_ident()
+        if outcome == "empty":
+            self._empty_streaks[worker] += 1
+            if self._empty_streaks[worker] < EMPTY_STREAK:
+                return
+            del self._empty_streaks[worker]
+        elif outcome in ("ok", "throttled", "timeout"):
+            self._empty_streaks.pop(worker, None)
+
+        if outcome in BACKPRESSURE:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.limit = max(1.0, self.limit * self.decrease)
+        elif outcome == "ok":
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "rate_per_s": round(self.rate, 3),
+                "concurrency": int(self.limit),
+                "in_flight": self._in_flight,
+                "throttles": self.throttles,
+                "signals": dict(self.counts),
+            }
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+"""
+Metrics, per-plan traces and profiling hooks for the pipeline.
+
+- TraceLog: one JSON line per plan (phase timings, outcome, bytes
+  downloaded), appended as plans finish -> step2_trace.jsonl
+- Metrics: running counters, gauges and latency histograms, rewritten
+  periodically in the Prometheus text format -> pipeline_metrics.prom
+  (readable by node_exporter's textfile collector, or just with grep)
+- profiled(): wrap a block in cProfile, or in a wall-clock sampling profiler
+  that sees every thread (so Step 2's session threads show up, including the
+  time they spend waiting on the site or the browser)
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from phase_stats import BUCKETS
+from plan_registry import NO_KEY, plan_id
+
+TRACE_FILE = "step2_trace.jsonl"
+METRICS_FILE = "pipeline_metrics.prom"
+PROFILE_DIR = Path("profiles")
+PROFILERS = ("cprofile", "sample")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    """Thread-safe counters / gauges / histograms with a Prometheus text export."""
+
+    def __init__(self, path: str | None = METRICS_FILE, flush_interval: float = 30.0):
+        self.path = Path(path) if path else None
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._types, self._help = {}, {}
+        self._values = defaultdict(float)                       # (name, labels) -> counter / gauge value
+        self._hists = defaultdict(lambda: [0] * (len(BUCKETS) + 1) + [0.0])  # bucket counts..., sum
+        self._last_flush = time.monotonic()
+
+    def _declare(self, name: str, kind: str, help: str):
+        if name not in self._types:
+            self._types[name] = kind
+            self._help[name] = help
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels):
+        with self._lock:
+            self._declare(name, "counter", help)
+            self._values[(name, tuple(sorted(labels.items())))] += value
+
+    def set(self, name: str, value: float, help: str = "", **labels):
+        with self._lock:
+            self._declare(name, "gauge", help)
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, seconds: float, help: str = "", **labels):
+        with self._lock:
+            self._declare(name, "histogram", help)
+            hist = self._hists[(name, tuple(sorted(labels.items())))]
+            hist[next((i for i, b in enumerate(BUCKETS) if seconds <= b), len(BUCKETS))] += 1
+            hist[-1] += seconds
+
+    def render(self) -> str:
+        with self._lock:
+            values = dict(self._values)
+            hists = {k: list(v) for k, v in self._hists.items()}
+            types, helps = dict(self._types), dict(self._help)
+
+        lines = []
+        for name in sorted(types):
+            if helps[name]:
+                lines.append(f"# HELP {name} {helps[name]}")
+            lines.append(f"# TYPE {name} {types[name]}")
+            if types[name] != "histogram":
+                for (n, labels), value in sorted(values.items()):
+                    if n == name:
+                        lines.append(f"{name}{_label_str(dict(labels))} {value:g}")
+                continue
+            for (n, labels), hist in sorted(hists.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip([*BUCKETS, "+Inf"], hist[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_str({**dict(labels), 'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_label_str(dict(labels))} {hist[-1]:.6f}")
+                lines.append(f"{name}_count{_label_str(dict(labels))} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, force: bool = True):
+        """Rewrite the metrics file (atomically); without force, at most every flush_interval."""
+        if self.path is None or (not force and time.monotonic() - self._last_flush < self.flush_interval):
+            return
+        self._last_flush = time.monotonic()
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render())
+        os.replace(tmp_path, self.path)
+
+
+class TraceLog:
+    """Append-only JSONL file shared by the worker threads."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class Step2Telemetry:
+    """
+    Turns one search group's captured phase spans (see PhaseStats.capture)
+    and results into trace lines and metrics. Spans without a key (search,
+    render, row scan, breadcrumb) are shared by every plan of the group;
+    keyed spans (downloads) belong to that plan only, and their sizes are
+    the bytes downloaded for it: filings already in the store add nothing.
+    """
+
+    def __init__(self, trace: TraceLog | None = None, metrics: Metrics | None = None):
+        self.trace = trace
+        self.metrics = metrics
+
+    def group_done(self, query: str, results: list[dict], spans: list[tuple], worker: str = ""):
+        shared, timeouts = defaultdict(float), defaultdict(list)
+        per_plan = defaultdict(lambda: defaultdict(float))
+        downloaded = defaultdict(int)
+        for phase, seconds, ok, key, size in spans:
+            (shared if key is None else per_plan[key])[phase] += seconds
+            downloaded[key] += size
+            if not ok:
+                timeouts[key].append(phase)
+            if self.metrics:
+                self.metrics.observe("step2_phase_seconds", seconds, "Step 2 phase latency", phase=phase)
+                if not ok:
+                    self.metrics.inc("step2_phase_timeouts_total", 1, "Step 2 phase timeouts", phase=phase)
+
+        if self.metrics:
+            self.metrics.inc("step2_searches_total", 1, "Searches submitted")
+        for result in results:
+            # download spans are keyed by plan id (plan_registry.plan_id)
+            plan, status = plan_id(result["Full_Plan_Name"], result.get("Plan_Key", NO_KEY)), result["Status"]
+            size = downloaded.get(plan, 0)
+            if self.metrics:
+                self.metrics.inc("step2_plans_total", 1, "Plans processed by outcome", status=status)
+                self.metrics.inc("step2_download_bytes_total", size, "PDF bytes downloaded")
+            if self.trace:
+                self.trace.write({
+                    "ts": round(time.time(), 3),
+                    "worker": worker.strip(" []"),
+                    "plan": result["Full_Plan_Name"],
+                    "plan_id": plan,
+                    "query": query,
+                    "group_size": len(results),
+                    "status": status,
+                    "bytes": size,
+                    "phases": {p: round(s, 4) for p, s in {**shared, **per_plan.get(plan, {})}.items()},
+                    "timeouts": timeouts.get(None, []) + timeouts.get(plan, []),
+                })
+        if self.metrics:
+            self.metrics.flush(force=False)
+
+    def close(self, rate_snapshot: dict | None = None):
+        if self.metrics:
+            if rate_snapshot:
+                self.metrics.set("step2_rate_per_second", rate_snapshot["rate_per_s"], "Adaptive search rate")
+                self.metrics.set("step2_concurrency", rate_snapshot["concurrency"], "Adaptive concurrency")
+            self.metrics.flush()
+        if self.trace:
+            self.trace.close()
+
+
+# ---------- profiling ----------
+class _Sampler(threading.Thread):
+    """Samples the stacks of all other threads every interval seconds (wall clock)."""
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._done.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+@contextmanager
+def profiled(name: str, profiler: str | None = None, out_dir: Path = PROFILE_DIR, interval: float = 0.005):
+    """
+    Profile the block with profiler = "cprofile" (this thread only, exact
+    call counts -> <name>.prof) or "sample" (all threads, wall clock ->
+    <name>.folded, flamegraph.pl / speedscope input). None does nothing.
+    Worker processes of a process pool are not covered by either.
+    """
+    if not profiler:
+        yield
+        return
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if profiler == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            path = out_dir / f"{name}.prof"
+            prof.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(15)
+            print(out.getvalue())
+            print(f"Profile saved to: {path} (python -m pstats {path})")
+        return
+
+    sampler = _Sampler(interval)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        path = out_dir / f"{name}.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in sampler.stacks.most_common()))
+        total = sum(sampler.stacks.values()) or 1
+        leaves = Counter()
+        for stack, count in sampler.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        print(f"\nTop frames for {name} ({total} samples, wall clock, all threads):")
+        for frame, count in leaves.most_common(15):
+            print(f"  {100 * count / total:5.1f}%  {frame}")
+        print(f"Folded stacks saved to: {path}")
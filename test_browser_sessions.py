@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from browser_sessions import SessionPool
+
+
+def test_acquire_raises_a_factory_error_instead_of_hanging(tmp_path):
+    def factory(download_dir, driver_path):
+        raise FileNotFoundError(driver_path)
+
+    pool = SessionPool(factory, lambda session: None, tmp_path, size=1, spares=0, driver_path="missing-chromedriver")
+    outcome = []
+    thread = threading.Thread(target=lambda: outcome.append(pytest.raises(FileNotFoundError, pool.acquire)),
+                              daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    pool.close()
+
+    assert not thread.is_alive()
+    assert outcome and pool.stats()["failed"] == 1
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+import pytest
+
+import download_watcher
+from download_watcher import DownloadWatcher
+
+
+@pytest.fixture(params=[True, False], ids=["watchdog", "poll"])
+def watcher(request, tmp_path, monkeypatch):
+    if request.param and not download_watcher.HAS_WATCHDOG:
+        pytest.skip("watchdog not installed")
+    monkeypatch.setattr(download_watcher, "HAS_WATCHDOG", request.param)
+    w = DownloadWatcher(tmp_path / "downloads", poll_interval=0.05)
+    yield w
+    w.close()
+
+
+def chrome_download(download_dir, name, duration=0.2):
+    """Chrome's sequence: Unconfirmed <n>.crdownload -> <name>.crdownload -> <name>."""
+    partial = download_dir / f"Unconfirmed {name}.crdownload"
+    partial.write_bytes(b"%PDF-1.4")
+    time.sleep(duration)
+    named = download_dir / f"{name}.crdownload"
+    os.replace(partial, named)
+    time.sleep(0.1)
+    os.replace(named, download_dir / name)
+
+
+def download(watcher, name, target_dir, timeout=3.0):
+    ticket = watcher.expect()
+    thread = threading.Thread(target=chrome_download, args=(watcher.download_dir, name))
+    thread.start()
+    ok = watcher.collect(ticket, target_dir / name, timeout=timeout)
+    thread.join()
+    return ok
+
+
+def test_timeout_does_not_fail_later_downloads(watcher, tmp_path):
+    # a click that never produced a file
+    assert not watcher.collect(watcher.expect(), tmp_path / "never.pdf", timeout=1.0)
+
+    assert [download(watcher, f"f{i}.pdf", tmp_path) for i in range(4)] == [True] * 4
+    assert [p.name for p in sorted(tmp_path.glob("f*.pdf"))] == [f"f{i}.pdf" for i in range(4)]
+
+
+def test_late_file_of_timed_out_request_is_dropped(watcher, tmp_path):
+    ticket = watcher.expect()
+    late = threading.Thread(target=chrome_download, args=(watcher.download_dir, "late.pdf", 0.6))
+    late.start()
+    assert not watcher.collect(ticket, tmp_path / "late.pdf", timeout=0.3)
+    late.join()
+    time.sleep(0.3)
+
+    assert download(watcher, "next.pdf", tmp_path)
+    assert (tmp_path / "next.pdf").exists()
+    assert not (tmp_path / "late.pdf").exists()
+    assert not (watcher.download_dir / "late.pdf").exists()
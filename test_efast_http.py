@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, ResponseError
+
+import efast_http
+from efast_http import EfastHttpClient, is_throttled
+from filing_store import FilingStore
+from mock_efast import filings_for, start_server
+from phase_stats import PhaseStats
+from rate_control import RateController
+
+SCRAPER = Path(__file__).resolve().parent / "Searching and Downloading.py"
+
+
+@pytest.fixture(scope="module")
+def scraper():
+    spec = importlib.util.spec_from_file_location("searching_and_downloading", SCRAPER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttled_search_slows_the_rate_controller(scraper, tmp_path, status):
+    server, base_url = start_server(filings_for(["ACME 401K PLAN"]), throttle_rate=1.0, throttle_status=status)
+    client = EfastHttpClient(base_url)
+    rate = RateController(initial_rate=2.0)
+    try:
+        results = scraper.process_group_http(client, "ACME", ["ACME 401K PLAN"], PhaseStats(), rate,
+                                             FilingStore(tmp_path))
+    finally:
+        client.close()
+        server.shutdown()
+
+    assert [r["Status"] for r in results] == ["error"]
+    assert rate.counts["throttled"] == 1
+    assert rate.rate == 1.0
+    # answered straight away, not retried inside the client
+    assert server.RequestHandlerClass.stats["searches"] == 1
+
+
+def test_retry_error_from_503_is_throttled():
+    cause = MaxRetryError(None, "/services/afs", ResponseError("too many 503 error responses"))
+    assert is_throttled(requests.exceptions.RetryError(cause))
+    cause = MaxRetryError(None, "/services/afs", ResponseError("too many 502 error responses"))
+    assert not is_throttled(requests.exceptions.RetryError(cause))
+
+
+def test_search_follows_result_pages(scraper, tmp_path, monkeypatch):
+    names = [f"ACME {i:03d} 401K PLAN" for i in range(249)] + ["ACME ZEPHYR WIDGETS EMPLOYEE SAVINGS TRUST"]
+    server, base_url = start_server(filings_for(names))
+    client = EfastHttpClient(base_url)
+    try:
+        rows, truncated = client.search("ACME")
+        assert len(rows) == 250 and not truncated
+
+        monkeypatch.setattr(efast_http, "MAX_PAGES", 2)
+        results = scraper.process_group_http(client, "ACME", [names[0], names[-1]], PhaseStats(),
+                                             RateController(), FilingStore(tmp_path))
+    finally:
+        client.close()
+        server.shutdown()
+
+    # the last plan was on the unread third page: not a final not_found
+    assert [r["Status"] for r in results] == ["found", "truncated"]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from plan_features import extract_features
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("The employer contributes 50% of elective deferrals up to 6% of compensation.",
+     {"match_tiers": "50@6", "match_max_pct": 3.0, "match_cap_pct": None}),
+    ("The Employer will match 100% of the first 3% and 50% of the next 2% of pay deferred.",
+     {"match_tiers": "100@3;50@2", "match_max_pct": 4.0}),
+    ("Matching contributions shall not exceed 4% of a participant's compensation.",
+     {"match_tiers": None, "match_cap_pct": 4.0}),
+    ("A matching contribution not to exceed 5% of Compensation.", {"match_cap_pct": 5.0}),
+    ("Participants are 100% vested after a 3-year cliff vesting schedule.",
+     {"vesting": "cliff", "vesting_years": 3}),
+    ("Employees are automatically enrolled at a default deferral rate of 4%, with automatic increases.",
+     {"auto_enroll": True, "auto_enroll_rate_pct": 4.0, "auto_escalate": True}),
+])
+def test_sample_sentences(text, expected):
+    features = extract_features(text)
+    assert {key: features[key] for key in expected} == expected
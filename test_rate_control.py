@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from rate_control import EMPTY_STREAK, RateController
+
+
+def test_empty_results_spread_over_workers_are_not_a_streak():
+    rate = RateController(initial_rate=2.0)
+    workers = EMPTY_STREAK * 4
+    # all alive at once, so no two share a thread id
+    barrier = threading.Barrier(workers)
+
+    def worker():
+        rate.signal("empty")
+        barrier.wait()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert rate.rate == 2.0
+
+
+def test_empty_streak_of_one_worker_slows_down_to_the_floor():
+    rate = RateController(initial_rate=2.0, min_rate=0.5, cooldown=0)
+    for _ in range(EMPTY_STREAK - 1):
+        rate.signal("empty")
+    assert rate.rate == 2.0
+    rate.signal("empty")
+    assert rate.rate == 1.0
+
+    for _ in range(EMPTY_STREAK * 10):
+        rate.signal("empty")
+    assert rate.rate == 0.5